@@ -0,0 +1,62 @@
+"""
+Compares the normalizer with its masking patterns screened by the cheap trigger checks (PATTERN_TRIGGERS) against
+the plan without them, which is the normalizer before the triggers were added. The outputs of both must be the same,
+the time of each and the speedup are reported.
+
+    python -m benchmarks.normalizer_benchmark
+    python -m benchmarks.normalizer_benchmark lscp-0.5-fa-normalized.txt cleaned_wiki.txt --min-speedup 1.2
+
+every file is read line by line (e.g. the PersianTweets or WikipediaCorpus dumps of dadmatools.datasets), without
+files the news and tweet sample of the normalizer tests is used. --max-lines limits the number of lines used from
+each file, --repeat runs the texts of a file several times to get stable times on small files.
+"""
+import os
+import sys
+import time
+import argparse
+from itertools import islice
+
+from dadmatools.models.normalizer import Normalizer
+
+SAMPLE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dadmatools', 'tests', 'data', 'normalizer_sample.txt'))
+MASKS = dict(replace_email_with='<EMAIL>', replace_url_with='<URL>', replace_number_with='<NUM>',
+             replace_mobile_number_with='<MOBILE>', replace_home_number_with='<PHONE>')
+
+
+def time_normalizer(normalizer, texts):
+    start = time.perf_counter()
+    outputs = [normalizer.normalize(text) for text in texts]
+    return time.perf_counter() - start, outputs
+
+def benchmark(texts):
+    """returns the times of the normalizer without and with the trigger checks, the outputs must be the same"""
+    screened = Normalizer(**MASKS)
+    unscreened = Normalizer(**MASKS)
+    unscreened.replace_plan = [(pattern, repl, None) for pattern, repl, _ in unscreened.replace_plan]
+
+    unscreened_time, expected = time_normalizer(unscreened, texts)
+    screened_time, outputs = time_normalizer(screened, texts)
+    mismatches = [text for text, output, old in zip(texts, outputs, expected) if output != old]
+    if mismatches:
+        raise AssertionError('the trigger checks changed the output of {} lines, e.g. {!r}'.format(len(mismatches), mismatches[0]))
+    return unscreened_time, screened_time
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', default=[SAMPLE])
+    parser.add_argument('--max-lines', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--min-speedup', type=float, default=None, help='exits with an error if a file gets a lower speedup')
+    args = parser.parse_args()
+
+    slow = False
+    for path in args.files:
+        with open(path, encoding='utf-8') as f:
+            texts = [line.rstrip('\n') for line in islice(f, args.max_lines)] * args.repeat
+        unscreened_time, screened_time = benchmark(texts)
+        speedup = unscreened_time / max(screened_time, 1e-9)
+        slow = slow or (args.min_speedup is not None and speedup < args.min_speedup)
+        print('{}: {} lines, same output, without triggers {:.3f}s, with triggers {:.3f}s, speedup {:.2f}x'.format(
+            path, len(texts), unscreened_time, screened_time, speedup))
+    sys.exit(1 if slow else 0)
@@ -130,3 +130,94 @@ class Beam(object):
                 hyp[i] = -(cidx+1) # make index 1-based and flip it for token generation
 
         return hyp
+
+
+class BatchedBeam(object):
+    """
+    Beam search over a whole batch at once. Scores, outputs and back pointers of all
+    the beams are kept in [batch x size] tensors, so a step is a single topk over the
+    batch instead of one `Beam.advance` per batch element.
+    """
+    def __init__(self, batch_size, size, device=None):
+
+        self.batch_size = batch_size
+        self.size = size
+
+        # The score for each translation on the beams.
+        self.scores = torch.zeros(batch_size, size, device=device)
+
+        # The backpointers at each time-step.
+        self.prevKs = []
+
+        # The outputs at each time-step.
+        first = torch.full((batch_size, size), constant.PAD_ID, dtype=torch.long, device=device)
+        first[:, 0] = constant.SOS_ID
+        self.nextYs = [first]
+
+        # Whether the top of each beam has reached EOS.
+        self.done = torch.zeros(batch_size, dtype=torch.bool, device=device)
+
+    def get_current_state(self):
+        "Get the outputs for the current timestep (batch x size)."
+        return self.nextYs[-1]
+
+    def get_current_origin(self):
+        "Get the backpointers for the current timestep (batch x size)."
+        return self.prevKs[-1]
+
+    def advance(self, wordLk):
+        """
+        Advance all the beams which are not finished yet.
+
+        Parameters:
+
+        * `wordLk`- probs of advancing from the last step (batch x K x words)
+
+        Returns: True if the search is complete for every beam.
+        """
+        numWords = wordLk.size(2)
+
+        if len(self.prevKs) > 0:
+            # Sum the previous scores.
+            beamLk = wordLk + self.scores.unsqueeze(2)
+        else:
+            # first step, expand from the first position
+            beamLk = wordLk[:, :1]
+
+        bestScores, bestScoresId = beamLk.view(self.batch_size, -1).topk(self.size, 1, True, True)
+        prevK = bestScoresId // numWords
+        nextY = bestScoresId - prevK * numWords
+
+        # finished beams keep their scores, point to themselves and only emit EOS
+        done = self.done.unsqueeze(1)
+        self.scores = torch.where(done, self.scores, bestScores)
+        self.prevKs.append(torch.where(done, torch.arange(self.size, device=prevK.device).expand_as(prevK), prevK))
+        self.nextYs.append(nextY.masked_fill(done, constant.EOS_ID))
+
+        # End condition is when top-of-beam is EOS.
+        self.done = self.done | self.nextYs[-1][:, 0].eq(constant.EOS_ID)
+
+        return bool(self.done.all())
+
+    def sort_best(self):
+        return torch.sort(self.scores, 1, True)
+
+    def get_hyp(self, k):
+        """
+        Walk back to construct the full hypotheses.
+
+        Parameters:
+
+             * `k` - the position in the beam to construct, for every batch element.
+
+         Returns: The hypotheses, as lists of word ids
+        """
+        k = k.unsqueeze(1)
+        hyp = []
+        for j in range(len(self.prevKs) - 1, -1, -1):
+            hyp.append(self.nextYs[j+1].gather(1, k))
+            k = self.prevKs[j].gather(1, k)
+
+        if len(hyp) == 0:
+            return [[] for _ in range(self.batch_size)]
+        return torch.cat(hyp[::-1], 1).tolist()
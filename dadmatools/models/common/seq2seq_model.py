@@ -11,7 +11,7 @@ import numpy as np
 import dadmatools.models.common.seq2seq_constant as constant
 from dadmatools.models.common import utils
 from dadmatools.models.common.seq2seq_modules import LSTMAttention
-from dadmatools.models.common.beam import Beam
+from dadmatools.models.common.beam import BatchedBeam
 
 logger = logging.getLogger('stanza')
 
@@ -198,6 +198,7 @@ class Seq2SeqModel(nn.Module):
             return log_probs
         return log_probs.view(logits.size(0), logits.size(1), logits.size(2))
 
+    @torch.no_grad()
     def predict_greedy(self, src, src_mask, pos=None):
         """ Predict with greedy decoding. """
         enc_inputs = self.embedding(src)
@@ -222,27 +223,30 @@ class Seq2SeqModel(nn.Module):
         dec_inputs = self.embedding(self.SOS_tensor)
         dec_inputs = dec_inputs.expand(batch_size, dec_inputs.size(0), dec_inputs.size(1))
 
-        done = [False for _ in range(batch_size)]
-        total_done = 0
+        # predictions of all steps are kept on the device and only read back once decoding is over
+        output_buffer = src.new_full((batch_size, self.max_dec_len), constant.PAD_ID)
+        finished = torch.zeros(batch_size, dtype=torch.bool, device=src.device)
         max_len = 0
-        output_seqs = [[] for _ in range(batch_size)]
 
-        while total_done < batch_size and max_len < self.max_dec_len:
+        while max_len < self.max_dec_len:
             log_probs, (hn, cn) = self.decode(dec_inputs, hn, cn, h_in, src_mask, src=src)
             assert log_probs.size(1) == 1, "Output must have 1-step of output."
             _, preds = log_probs.squeeze(1).max(1, keepdim=True)
             dec_inputs = self.embedding(preds) # update decoder inputs
+            output_buffer[:, max_len] = preds.squeeze(1)
             max_len += 1
-            for i in range(batch_size):
-                if not done[i]:
-                    token = preds.data[i][0].item()
-                    if token == constant.EOS_ID:
-                        done[i] = True
-                        total_done += 1
-                    else:
-                        output_seqs[i].append(token)
+            finished |= preds.squeeze(1).eq(constant.EOS_ID)
+            if finished.all():
+                break
+
+        # every sequence ends right before its first EOS
+        output_buffer = output_buffer[:, :max_len].cpu()
+        is_eos = output_buffer.eq(constant.EOS_ID)
+        seq_lens = torch.where(is_eos.any(1), is_eos.int().argmax(1), torch.full_like(is_eos[:, 0], max_len, dtype=torch.long))
+        output_seqs = [seq[:seq_len] for seq, seq_len in zip(output_buffer.tolist(), seq_lens.tolist())]
         return output_seqs, edit_logits
 
+    @torch.no_grad()
     def predict(self, src, src_mask, pos=None, beam_size=5):
         """ Predict with beam search. """
         if beam_size == 1:
@@ -267,51 +271,37 @@ class Seq2SeqModel(nn.Module):
             edit_logits = None
 
         # (2) set up beam
-        with torch.no_grad():
-            h_in = h_in.data.repeat(beam_size, 1, 1) # repeat data for beam search
-            src_mask = src_mask.repeat(beam_size, 1)
-            # repeat decoder hidden states
-            hn = hn.data.repeat(beam_size, 1)
-            cn = cn.data.repeat(beam_size, 1)
-        beam = [Beam(beam_size, self.use_cuda) for _ in range(batch_size)]
-
-        def update_state(states, idx, positions, beam_size):
-            """ Select the states according to back pointers. """
-            for e in states:
-                br, d = e.size()
-                s = e.contiguous().view(beam_size, br // beam_size, d)[:,idx]
-                s.data.copy_(s.data.index_select(0, positions))
+        # all the beams are kept in [beam * batch] rows, row k * batch_size + b holding beam k of batch element b
+        h_in = h_in.repeat(beam_size, 1, 1) # repeat data for beam search
+        src_mask = src_mask.repeat(beam_size, 1)
+        src = src.repeat(beam_size, 1)
+        # repeat decoder hidden states
+        hn = hn.repeat(beam_size, 1)
+        cn = cn.repeat(beam_size, 1)
+        beam = BatchedBeam(batch_size, beam_size, device=h_in.device)
+        batch_offsets = torch.arange(batch_size, device=h_in.device)
 
         # (3) main loop
         for i in range(self.max_dec_len):
-            dec_inputs = torch.stack([b.get_current_state() for b in beam]).t().contiguous().view(-1, 1)
+            dec_inputs = beam.get_current_state().t().contiguous().view(-1, 1)
             dec_inputs = self.embedding(dec_inputs)
             log_probs, (hn, cn) = self.decode(dec_inputs, hn, cn, h_in, src_mask, src=src)
             log_probs = log_probs.view(beam_size, batch_size, -1).transpose(0,1)\
                     .contiguous() # [batch, beam, V]
 
-            # advance each beam
-            done = []
-            for b in range(batch_size):
-                is_done = beam[b].advance(log_probs.data[b])
-                if is_done:
-                    done += [b]
-                # update beam state
-                update_state((hn, cn), b, beam[b].get_current_origin(), beam_size)
+            # advance all beams
+            is_done = beam.advance(log_probs)
+            # select the states according to back pointers
+            positions = (beam.get_current_origin().t() * batch_size + batch_offsets).reshape(-1)
+            hn = hn.index_select(0, positions)
+            cn = cn.index_select(0, positions)
 
-            if len(done) == batch_size:
+            if is_done:
                 break
 
         # back trace and find hypothesis
-        all_hyp, all_scores = [], []
-        for b in range(batch_size):
-            scores, ks = beam[b].sort_best()
-            all_scores += [scores[0]]
-            k = ks[0]
-            hyp = beam[b].get_hyp(k)
-            hyp = utils.prune_hyp(hyp)
-            hyp = [i.item() for i in hyp]
-            all_hyp += [hyp]
+        _, ks = beam.sort_best()
+        all_hyp = [utils.prune_hyp(hyp) for hyp in beam.get_hyp(ks[:, 0])]
 
         return all_hyp, edit_logits
 
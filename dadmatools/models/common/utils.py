@@ -1,6 +1,7 @@
 """
 Utility functions.
 """
+import functools
 import logging
 import os
 from collections import Counter
@@ -111,6 +112,38 @@ def keep_partial_grad(grad, topk):
     grad.data[topk:].zero_()
     return grad
 
+def eval_mode(model):
+    """
+    Put a model in eval mode. Besides torch modules, this accepts the objects returned by the load_model()
+    functions: trainers or parsers holding a torch module in their `model` attribute and tuples of those.
+    """
+    if isinstance(model, torch.nn.Module):
+        model.eval()
+    elif isinstance(model, (tuple, list)):
+        for m in model:
+            eval_mode(m)
+    elif isinstance(getattr(model, 'model', None), torch.nn.Module):
+        model.model.eval()
+    return model
+
+def inference_context():
+    """ torch.inference_mode() where it is available (torch>=1.9), torch.no_grad() otherwise. """
+    if hasattr(torch, 'inference_mode'):
+        return torch.inference_mode()
+    return torch.no_grad()
+
+def inference(func):
+    """
+    Decorator for the prediction functions whose first argument is the loaded model: the model is put in
+    eval mode and the function runs without building autograd graphs.
+    """
+    @functools.wraps(func)
+    def wrapper(model, *args, **kwargs):
+        eval_mode(model)
+        with inference_context():
+            return func(model, *args, **kwargs)
+    return wrapper
+
 # other utils
 def ensure_dir(d, verbose=True):
     if not os.path.exists(d):
@@ -1,13 +1,18 @@
 from supar import Parser
-import re
 import string
 from copy import copy
 import numpy as np
 import torch
 from pathlib import Path
+from dadmatools.models.common.utils import eval_mode, inference
 import dadmatools.pipeline.download as dl                   
 
   
+PUNCTUATIONS = set(string.punctuation + '،؛؟«»')
+## supar replaces the brackets with these in the trees
+SPECIAL_TOKENS = {'-LRB-', '-RRB-'}
+BRACKETS = {'(': ')', '[': ']', '{': '}', '«': '»', '-LRB-': '-RRB-'}
+
 def parse_args():
     args = {
         'save_name':'None', 
@@ -29,33 +34,89 @@ def load_model():
     model_name = args['load_name']
     parser = Parser.load(model_name)
     
-    return parser
+    return eval_mode(parser)
 
 
 
+@inference
 def cons_parser(model,input_sentence):
     tokens = input_sentence.split()
     pred = model.predict(tokens,verbose=False)[0]
     return pred
-    
 
-def chunker(const_output):
+@inference
+def cons_parser_batch(model, sentences):
+    '''sentences stores list of all sentences of the batch e.g. sentences = [['this', 'is', 'a', 'test', '.'], ['another', 'one']]
+    all of them are parsed in a single predict call (supar batches them itself), None is returned for the empty sentences'''
+    indices = [i for i, tokens in enumerate(sentences) if len(tokens) > 0]
+    preds = [None] * len(sentences)
+    if indices:
+        dataset = model.predict([sentences[i] for i in indices], verbose=False)
+        for i, pred in zip(indices, dataset):
+            preds[i] = pred
+    return preds
+
+
+def get_tree(const_output):
+    '''the nltk tree of a sentence parsed by supar (a TreeSentence keeps it before its chart, as its __repr__ does)'''
+    return const_output.values[-2] if hasattr(const_output, 'values') else const_output
+
+def is_punctuation(word):
+    return word in SPECIAL_TOKENS or all(char in PUNCTUATIONS for char in word)
 
-    const_output = str(const_output)
-    const_output = re.sub(r"(?<=\()[^\(\)\s]+(?=\s[^(])", "_", const_output)
-    tags = re.findall(r"(?<=\()[^\(\)\s]+(?=\s\(\_)",const_output)
-    reslist = re.findall(r'\([^a-zA-Z]+\)',const_output)
-    res = [i.replace('_','').replace('(','').replace(')','') for i in reslist]
+def trim_punctuations(words):
+    '''
+    the (start, end) of a run of words without the punctuations of its edges, a bracket (or a guillemet) is kept
+    when the run also holds its pair e.g. the chunk of (NP او « خوب ») is او « خوب »
+    '''
+    start, end = 0, len(words)
+    while start < end and is_punctuation(words[start]) and BRACKETS.get(words[start]) not in words[start+1:end]:
+        start += 1
+    closings = {closing: opening for opening, closing in BRACKETS.items()}
+    while end > start and is_punctuation(words[end-1]) and closings.get(words[end-1]) not in words[start:end-1]:
+        end -= 1
+    return start, end
+
+def chunk_spans(const_output):
+    '''
+    the chunks of a constituency tree as (start, end, label) token spans: a chunk is a run of adjacent words under
+    the same constituent and takes its label, the punctuations at the edges of a run are not part of its chunk.
+    '''
+    spans = []
+    if const_output is None:
+        return spans
+
+    def add_chunk(start, words, label):
+        trim_start, trim_end = trim_punctuations(words)
+        if trim_start < trim_end:
+            spans.append((start + trim_start, start + trim_end, label))
+
+    def walk(node, position):
+        start, words = position, []
+        for child in node:
+            if hasattr(child, 'label') and hasattr(child[0], 'label'):
+                add_chunk(start, words, node.label())
+                position = walk(child, position)
+                start, words = position, []
+                continue
+            ## a word (or the part of speech node of a word)
+            words.append(child[0] if hasattr(child, 'label') else child)
+            position += 1
+        add_chunk(start, words, node.label())
+        return position
+
+    walk(get_tree(const_output), 0)
+    return spans
+
+def chunker(const_output):
+    words = get_tree(const_output).leaves()
     out_str = ''
-    for i,k in zip(res,tags):
-        tmp = ''
-        for j in i:
-            if j in (string.punctuation+'،؛؟'):
-                tmp = '[' + i.replace(j,'').strip() + ' ' + k + '] '  + j+' '
-        if tmp!='':
-            out_str = out_str + tmp
-        else:
-            out_str = out_str + '[' + i + ' ' + k +'] '
+    position = 0
+    for start, end, label in chunk_spans(const_output):
+        out_str += ''.join(word + ' ' for word in words[position:start])
+        out_str += '[' + ' '.join(words[start:end]) + ' ' + label + '] '
+        position = end
+    out_str += ''.join(word + ' ' for word in words[position:])
 
     return out_str
     
@@ -8,6 +8,7 @@ from dadmatools.models.flair.list_data import ListCorpus
 import torch
 from pathlib import Path
 
+from dadmatools.models.common.utils import eval_mode, inference
 import dadmatools.pipeline.download as dl
 
 def get_config():
@@ -90,12 +91,18 @@ def make_tag_dictionary() -> Dictionary:
         # import pdb;pdb.set_trace()
         return tag_dictionary
 
-def create_model(config):
-		embeddings = config['embeddings']
-		embedding_list: List[TokenEmbeddings]=[]
-		for embedding in config['embeddings']:
-			embedding_list.append(getattr(Embeddings,embedding.split('-')[0])(**embeddings[embedding]))
-		embeddings: Embeddings.StackedEmbeddings = Embeddings.StackedEmbeddings(embeddings=embedding_list)
+def create_model(config, shared_embeddings=None):
+		## with shared_embeddings (the encoder of another model) the parser's own BERT is neither built nor loaded
+		load_kwargs = {}
+		if shared_embeddings is None:
+			embeddings = config['embeddings']
+			embedding_list: List[TokenEmbeddings]=[]
+			for embedding in config['embeddings']:
+				embedding_list.append(getattr(Embeddings,embedding.split('-')[0])(**embeddings[embedding]))
+			embeddings: Embeddings.StackedEmbeddings = Embeddings.StackedEmbeddings(embeddings=embedding_list)
+		else:
+			embeddings = shared_embeddings
+			load_kwargs['embeddings'] = shared_embeddings
 		kwargs=copy.deepcopy(config['model'])
 		classname=list(kwargs.keys())[0]
 		kwargs=copy.deepcopy(config['model'][classname])
@@ -112,12 +119,12 @@ def create_model(config):
 
 		if (base_path / "best-model.pt").exists():
 # 			print('Loading pretraining best model')
-			tagger = tagger.load(base_path / "best-model.pt")
+			tagger = tagger.load(base_path / "best-model.pt", **load_kwargs)
 		elif (base_path / "final-model.pt").exists():
 # 			print('Loading pretraining final model')
-			tagger = tagger.load(base_path / "final-model.pt")
+			tagger = tagger.load(base_path / "final-model.pt", **load_kwargs)
 		elif (base_path).exists():
-			tagger = tagger.load(base_path)
+			tagger = tagger.load(base_path, **load_kwargs)
 		else:
 			assert 0, str(base_path)+ ' not exist!'
 		tagger.use_bert=False
@@ -134,7 +141,20 @@ def dependancy_parser_model(tokens_list):
     return preds_arcs, preds_rels
 
 
-def load_model():
+def can_share_encoder(config, other_config):
+    '''
+    two models can only share their encoder if both heads were trained on the same frozen encoder,
+    a head trained with a fine-tuned encoder does not fit the states of any other encoder
+    '''
+    embeddings = config['embeddings']
+    return embeddings == other_config['embeddings'] and not any(embedding.get('fine_tune', False) for embedding in embeddings.values())
+
+def load_model(shared_embeddings=None):
+    '''
+    shared_embeddings are the ParsBERT embeddings of the POS tagger in the shared encoder mode: the parser is built
+    around them, so one copy of BERT is kept in memory. it is only valid if can_share_encoder() holds for the configs
+    of the tagger and the parser, then both models give the same outputs as with their own copies of the encoder.
+    '''
     ## donwload models
     dl.download_model('parsbert', process_func=dl._unzip_process_func)
     dl.download_model('dependencyparser')
@@ -145,17 +165,20 @@ def load_model():
     config['target_dir'] = prefix + config['target_dir']
     config['embeddings']['BertEmbeddings-0']['bert_model_or_path'] = prefix + config['embeddings-saved-dir']
     
-    student=create_model(config)
+    student=create_model(config, shared_embeddings=shared_embeddings)
     base_path=Path(config['target_dir'])/config['model_name']
     
-    return student
+    return eval_mode(student)
 
 
+@inference
 def depparser(model, tokens_list):
     preds_arcs, preds_rels = model.predict(tokens_list,prediction_mode=True)
     preds_arcs = [p.item() for p in preds_arcs]
     return preds_arcs, preds_rels
 
-
-
+@inference
+def depparser_batch(model, sentences):
+    '''sentences stores list of all sentences of the batch e.g. sentences = [['this', 'is', 'a', 'test', '.'], ['another', 'one']]'''
+    return model.predict_batch(sentences, prediction_mode=True)
 
@@ -13,32 +13,28 @@ else:
 
 from . import data
 from dadmatools.models.flair import models
-from . import visual
-from . import trainers
 from . import nn
 
-import logging.config
+import sys
+import logging
+import importlib
 
 __version__ = "0.4.3"
 
-logging.config.dictConfig(
-    {
-        "version": 1,
-        "disable_existing_loggers": False,
-        "formatters": {"standard": {"format": "%(asctime)-15s %(message)s"}},
-        "handlers": {
-            "console": {
-                "level": "INFO",
-                "class": "logging.StreamHandler",
-                "formatter": "standard",
-                "stream": "ext://sys.stdout",
-            }
-        },
-        "loggers": {
-            "flair": {"handlers": ["console"], "level": "INFO", "propagate": False}
-        },
-        "root": {"handlers": ["console"], "level": "WARNING"},
-    }
-)
 
+def __getattr__(name):
+    # the training and plotting modules are only imported when they are used
+    if name in ("visual", "trainers"):
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# only the flair logger is configured, the logging setup of the application is left untouched
 logger = logging.getLogger("flair")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(logging.Formatter("%(asctime)-15s %(message)s"))
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+logger.propagate = False
@@ -123,23 +123,15 @@ def chu_liu_edmonds(length: int,
     """
     # Set the initial graph to be the greedy best one.
     # Node '0' is always the root node.
-    parents = [-1]
-    for node1 in range(1, length):
-        # Init the parent of each node to be the root node.
-        parents.append(0)
-        if current_nodes[node1]:
-            # If the node is a representative,
-            # find the max outgoing edge to other non-root representative,
-            # and update its parent.
-            max_score = score_matrix[0, node1]
-            for node2 in range(1, length):
-                if node2 == node1 or not current_nodes[node2]:
-                    continue
-
-                new_score = score_matrix[node2, node1]
-                if new_score > max_score:
-                    max_score = new_score
-                    parents[node1] = node2
+    # Each representative takes its max incoming edge from the root or another representative,
+    # argmax keeps the first max so the root (and then the lowest node) wins the ties.
+    candidates = numpy.where(numpy.asarray(current_nodes)[:, None], score_matrix[:length, :length], -numpy.inf)
+    candidates[0] = score_matrix[0, :length]
+    numpy.fill_diagonal(candidates, -numpy.inf)
+    parents = candidates.argmax(axis=0)
+    parents[~numpy.asarray(current_nodes)] = 0
+    parents[0] = -1
+    parents = parents.tolist()
 
     # Check if this solution has a cycle.
     has_cycle, cycle = _find_cycle(parents, length, current_nodes)
@@ -167,38 +159,31 @@ def chu_liu_edmonds(length: int,
     # For each node in the graph, find the maximum weight incoming
     # and outgoing edge into the cycle.
     cycle_representative = cycle[0]
-    for node in range(length):
-        # Nodes not in the cycle.
-        if not current_nodes[node] or node in cycle:
-            continue
-
-        in_edge_weight = float("-inf")
-        in_edge = -1
-        out_edge_weight = float("-inf")
-        out_edge = -1
-
-        for node_in_cycle in cycle:
-            if score_matrix[node_in_cycle, node] > in_edge_weight:
-                in_edge_weight = score_matrix[node_in_cycle, node]
-                in_edge = node_in_cycle
-
-            # Add the new edge score to the cycle weight
-            # and subtract the edge we're considering removing.
-            score = (cycle_weight +
-                     score_matrix[node, node_in_cycle] -
-                     score_matrix[parents[node_in_cycle], node_in_cycle])
-
-            if score > out_edge_weight:
-                out_edge_weight = score
-                out_edge = node_in_cycle
-
-        score_matrix[cycle_representative, node] = in_edge_weight
-        old_input[cycle_representative, node] = old_input[in_edge, node]
-        old_output[cycle_representative, node] = old_output[in_edge, node]
-
-        score_matrix[node, cycle_representative] = out_edge_weight
-        old_output[node, cycle_representative] = old_output[node, out_edge]
-        old_input[node, cycle_representative] = old_input[node, out_edge]
+    # Nodes not in the cycle, all of them are handled at once.
+    nodes = numpy.array([node for node in range(length) if current_nodes[node] and node not in cycle], dtype=numpy.int64)
+    cycle_nodes = numpy.array(cycle, dtype=numpy.int64)
+    if len(nodes) > 0:
+        in_scores = score_matrix[numpy.ix_(cycle_nodes, nodes)]
+        # Add the new edge score to the cycle weight
+        # and subtract the edge we're considering removing.
+        out_scores = (cycle_weight +
+                      score_matrix[numpy.ix_(nodes, cycle_nodes)] -
+                      score_matrix[[parents[node] for node in cycle], cycle_nodes])
+        in_edge = cycle_nodes[in_scores.argmax(axis=0)]
+        out_edge = cycle_nodes[out_scores.argmax(axis=1)]
+        in_edge_weight = in_scores.max(axis=0)
+        out_edge_weight = out_scores.max(axis=1)
+        # as in the scalar version, an edge is only taken if its score is above -inf
+        in_edge[~(in_edge_weight > float("-inf"))] = -1
+        out_edge[~(out_edge_weight > float("-inf"))] = -1
+
+        score_matrix[cycle_representative, nodes] = in_edge_weight
+        old_input[cycle_representative, nodes] = old_input[in_edge, nodes]
+        old_output[cycle_representative, nodes] = old_output[in_edge, nodes]
+
+        score_matrix[nodes, cycle_representative] = out_edge_weight
+        old_output[nodes, cycle_representative] = old_output[nodes, out_edge]
+        old_input[nodes, cycle_representative] = old_input[nodes, out_edge]
 
     # For the next recursive iteration, we want to consider the cycle as a
     # single node. Here we collapse the cycle into the first node in the
@@ -4,7 +4,7 @@ import logging
 from abc import abstractmethod
 from collections import Counter
 from pathlib import Path
-from typing import List, Union, Dict
+from typing import List, Union, Dict, Tuple
 
 import gensim
 import numpy as np
@@ -2575,6 +2575,7 @@ class BertEmbeddings(TokenEmbeddings):
         fine_tune: bool = False,
         sentence_feat: bool = False,
         max_sequence_length = 510,
+        window_stride: int = None,
     ):
         """
         Bidirectional transformer embeddings of words, as proposed in Devlin et al., 2018.
@@ -2583,6 +2584,9 @@ class BertEmbeddings(TokenEmbeddings):
         :param layers: string indicating which layers to take for embedding
         :param pooling_operation: how to get from token piece embeddings to token embedding. Either pool them and take
         the average ('mean') or use first word piece embedding as token embedding ('first)
+        :param max_sequence_length: longest window of subtokens fed to BERT, longer sentences are split into
+        overlapping windows
+        :param window_stride: distance between the starts of two consecutive windows (defaults to half a window)
         """
         super().__init__()
 
@@ -2599,6 +2603,7 @@ class BertEmbeddings(TokenEmbeddings):
         # if True, return the sentence_feat
         self.sentence_feat=sentence_feat
         self.max_sequence_length = max_sequence_length
+        self.window_stride = window_stride
 
     class BertInputFeatures(object):
         """Private helper class for holding BERT-formatted features"""
@@ -2611,6 +2616,9 @@ class BertEmbeddings(TokenEmbeddings):
             input_mask,
             input_type_ids,
             token_subtoken_count,
+            sentence_index=0,
+            window_start=0,
+            owned_subtokens=None,
         ):
             self.unique_id = unique_id
             self.tokens = tokens
@@ -2618,58 +2626,140 @@ class BertEmbeddings(TokenEmbeddings):
             self.input_mask = input_mask
             self.input_type_ids = input_type_ids
             self.token_subtoken_count = token_subtoken_count
+            # index of the sentence this window belongs to and offset of its first subtoken in the sentence
+            self.sentence_index = sentence_index
+            self.window_start = window_start
+            # range of sentence subtokens whose states are taken from this window
+            self.owned_subtokens = owned_subtokens
+
+    def _tokenize_sentences(self, sentences) -> List[List[List[str]]]:
+        """Splits every token of the sentences into BERT subtokens. Each token is tokenized only once per batch."""
+        tokenized = []
+        for sentence in sentences:
+            sentence_subtokens = []
+            for token in sentence:
+                subtokens = self.tokenizer.tokenize(token.text)
+                if len(subtokens) == 0:
+                    # e.g. a lone zero-width non-joiner, keep one position for it so that every token gets an embedding
+                    subtokens = [self.tokenizer.unk_token]
+                sentence_subtokens.append(subtokens)
+            tokenized.append(sentence_subtokens)
+        return tokenized
+
+    def _sliding_windows(self, num_subtokens: int, window_size: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Splits a sentence of num_subtokens subtokens into overlapping windows of at most window_size subtokens.
+        Returns (start, end, owned_start, owned_end) for each window, where the owned ranges cover the sentence
+        exactly once and each overlap is split in the middle, so every subtoken is read from the window in which
+        it has the most context.
+        """
+        if num_subtokens <= window_size:
+            return [(0, num_subtokens, 0, num_subtokens)]
+        stride = getattr(self, 'window_stride', None) or window_size // 2
+        stride = max(1, min(stride, window_size))
+        starts = list(range(0, num_subtokens - window_size, stride)) + [num_subtokens - window_size]
+        windows = []
+        for window_index, start in enumerate(starts):
+            end = start + window_size
+            owned_start = 0 if window_index == 0 else windows[-1][3]
+            if window_index == len(starts) - 1:
+                owned_end = num_subtokens
+            else:
+                owned_end = (starts[window_index + 1] + end) // 2
+            windows.append((start, end, owned_start, owned_end))
+        return windows
 
     def _convert_sentences_to_features(
-        self, sentences, max_sequence_length: int
+        self, sentences, max_sequence_length: int, tokenized = None
     ) -> [BertInputFeatures]:
 
+        window_size = max_sequence_length
         max_sequence_length = max_sequence_length + 2
+        if tokenized is None:
+            tokenized = self._tokenize_sentences(sentences)
 
         features: List[BertEmbeddings.BertInputFeatures] = []
-        for (sentence_index, sentence) in enumerate(sentences):
+        for (sentence_index, sentence_subtokens) in enumerate(tokenized):
 
-            bert_tokenization: List[str] = []
-            token_subtoken_count: Dict[int, int] = {}
+            sentence_tokenization: List[str] = []
+            # number of subtokens of each token (in token order)
+            token_subtoken_count: List[int] = []
 
-            for token in sentence:
-                subtokens = self.tokenizer.tokenize(token.text)
-                bert_tokenization.extend(subtokens)
-                token_subtoken_count[token.idx] = len(subtokens)
-            if len(bert_tokenization) > max_sequence_length - 2:
-                bert_tokenization = bert_tokenization[0 : (max_sequence_length - 2)]
-
-            tokens = []
-            input_type_ids = []
-            tokens.append("[CLS]")
-            input_type_ids.append(0)
-            for token in bert_tokenization:
-                tokens.append(token)
+            for subtokens in sentence_subtokens:
+                sentence_tokenization.extend(subtokens)
+                token_subtoken_count.append(len(subtokens))
+
+            # sentences longer than the model input are encoded as several overlapping windows
+            for start, end, owned_start, owned_end in self._sliding_windows(len(sentence_tokenization), window_size):
+                bert_tokenization = sentence_tokenization[start:end]
+
+                tokens = []
+                input_type_ids = []
+                tokens.append("[CLS]")
                 input_type_ids.append(0)
-            tokens.append("[SEP]")
-            input_type_ids.append(0)
-            input_ids = self.tokenizer.convert_tokens_to_ids(tokens)
-            # The mask has 1 for real tokens and 0 for padding tokens. Only real
-            # tokens are attended to.
-            input_mask = [1] * len(input_ids)
-
-            # Zero-pad up to the sequence length.
-            while len(input_ids) < max_sequence_length:
-                input_ids.append(0)
-                input_mask.append(0)
+                for token in bert_tokenization:
+                    tokens.append(token)
+                    input_type_ids.append(0)
+                tokens.append("[SEP]")
                 input_type_ids.append(0)
-            features.append(
-                BertEmbeddings.BertInputFeatures(
-                    unique_id=sentence_index,
-                    tokens=tokens,
-                    input_ids=input_ids,
-                    input_mask=input_mask,
-                    input_type_ids=input_type_ids,
-                    token_subtoken_count=token_subtoken_count,
+                input_ids = self.tokenizer.convert_tokens_to_ids(tokens)
+                # The mask has 1 for real tokens and 0 for padding tokens. Only real
+                # tokens are attended to.
+                input_mask = [1] * len(input_ids)
+
+                # Zero-pad up to the sequence length.
+                while len(input_ids) < max_sequence_length:
+                    input_ids.append(0)
+                    input_mask.append(0)
+                    input_type_ids.append(0)
+                features.append(
+                    BertEmbeddings.BertInputFeatures(
+                        unique_id=len(features),
+                        tokens=tokens,
+                        input_ids=input_ids,
+                        input_mask=input_mask,
+                        input_type_ids=input_type_ids,
+                        token_subtoken_count=token_subtoken_count,
+                        sentence_index=sentence_index,
+                        window_start=start,
+                        owned_subtokens=(owned_start, owned_end),
+                    )
                 )
-            )
 
         return features
 
+    def _pool_subtokens(self, hidden_states, features) -> torch.Tensor:
+        """
+        Pools the subtoken states of the whole batch ([windows, seq, hidden]) into one vector per token. The
+        states of long sentences are stitched from their windows first. The tokens of all sentences are returned
+        in order as a [num_tokens, hidden] tensor.
+        """
+        seq_len = hidden_states.shape[1]
+        subtoken_positions = []
+        subtoken_counts = []
+        for row, feature in enumerate(features):
+            if feature.window_start == 0:
+                subtoken_counts.extend(feature.token_subtoken_count)
+            owned_start, owned_end = feature.owned_subtokens
+            # position 0 of every window holds [CLS]
+            offset = row * seq_len + 1 - feature.window_start
+            subtoken_positions.extend(range(owned_start + offset, owned_end + offset))
+
+        device = hidden_states.device
+        flat_states = hidden_states.reshape(-1, hidden_states.shape[-1])
+        # stitched states of all subtokens of all sentences, in order
+        subtoken_states = flat_states.index_select(0, torch.tensor(subtoken_positions, dtype=torch.long, device=device))
+        subtoken_counts = torch.tensor(subtoken_counts, dtype=torch.long, device=device)
+
+        if self.pooling_operation == "first":
+            # use first subword embedding if pooling operation is 'first'
+            return subtoken_states.index_select(0, torch.cumsum(subtoken_counts, 0) - subtoken_counts)
+
+        # otherwise, do a mean over all subwords in token
+        token_ids = torch.repeat_interleave(torch.arange(len(subtoken_counts), device=device), subtoken_counts)
+        sums = subtoken_states.new_zeros(len(subtoken_counts), subtoken_states.shape[-1]).index_add(0, token_ids, subtoken_states)
+        return sums / subtoken_counts.clamp(min=1).unsqueeze(-1).type_as(sums)
+
     def _add_embeddings_internal(self, sentences: List[Sentence]) -> List[Sentence]:
         """Add embeddings to all words in a list of sentences. If embeddings are already added,
         updates only if embeddings are non-static."""
@@ -2684,26 +2774,18 @@ class BertEmbeddings(TokenEmbeddings):
                         sentences = self.assign_batch_features(sentences)
                         return sentences
 
-        # first, find longest sentence in batch
-        try:
-            longest_sentence_in_batch: int = len(
-                max(
-                    [
-                        self.tokenizer.tokenize(sentence.to_tokenized_string())
-                        for sentence in sentences
-                    ],
-                    key=len,
-                )
-            )
-        except:
-            pdb.set_trace()
+        # first, find longest sentence in batch, longer sentences are split into windows of max_sequence_length
+        tokenized = self._tokenize_sentences(sentences)
+        longest_sentence_in_batch: int = max(
+            sum(len(subtokens) for subtokens in sentence_subtokens) for sentence_subtokens in tokenized
+        )
         if not hasattr(self,'max_sequence_length'):
             self.max_sequence_length=510
         if longest_sentence_in_batch>self.max_sequence_length:
             longest_sentence_in_batch=self.max_sequence_length
         # prepare id maps for BERT model
         features = self._convert_sentences_to_features(
-            sentences, longest_sentence_in_batch
+            sentences, longest_sentence_in_batch, tokenized=tokenized
         )
         all_input_ids = torch.LongTensor([f.input_ids for f in features]).to(
             flair.device
@@ -2724,75 +2806,33 @@ class BertEmbeddings(TokenEmbeddings):
 
         with gradient_context:
             sequence_output, pooled_output, all_encoder_layers = self.model(all_input_ids, token_type_ids=None, attention_mask=all_input_masks, return_dict=False, output_hidden_states=True)
-#             print('input ids: ', all_input_ids)
-#             print('all_encoder_layers: ', all_encoder_layers)
-#             print(self.layer_indexes)
             # gradients are enable if fine-tuning is enabled
             if not hasattr(self,'sentence_feat'):
                 self.sentence_feat=False
             if self.sentence_feat:
-                self.pooled_output=pooled_output        
-
-            for sentence_index, sentence in enumerate(sentences):
-
-                feature = features[sentence_index]
-
-                # get aggregated embeddings for each BERT-subtoken in sentence
-                subtoken_embeddings = []
-                for token_index, _ in enumerate(feature.tokens):
-                    all_layers = []
-                    for layer_index in self.layer_indexes:
-                        if self.use_scalar_mix:
-                            layer_output = all_encoder_layers[int(layer_index)][
-                                sentence_index
-                            ]
-                        else:
-                            if not self.fine_tune:
-#                                 print('problem:- ', all_encoder_layers[int(layer_index)])
-                                layer_output = (
-                                    all_encoder_layers[int(layer_index)]
-                                    .detach()
-                                    .cpu()[sentence_index]
-                                    )
-                            else:
-                                layer_output = (
-                                    all_encoder_layers[int(layer_index)][sentence_index]
-                                    )
-
-                        all_layers.append(layer_output[token_index])
-
-                    if self.use_scalar_mix:
-                        sm = ScalarMix(mixture_size=len(all_layers))
-                        sm_embeddings = sm(all_layers)
-                        all_layers = [sm_embeddings]
-
-                    subtoken_embeddings.append(torch.cat(all_layers))
+                # the first window of every sentence
+                first_windows = [row for row, feature in enumerate(features) if feature.window_start == 0]
+                self.pooled_output=pooled_output[first_windows]
+
+            all_layers = [all_encoder_layers[int(layer_index)] for layer_index in self.layer_indexes]
+            if self.use_scalar_mix:
+                sm = ScalarMix(mixture_size=len(all_layers))
+                hidden_states = sm(all_layers)
+            else:
+                hidden_states = torch.cat(all_layers, -1)
+                if not self.fine_tune:
+                    hidden_states = hidden_states.detach()
 
-                # get the current sentence object
-                token_idx = 0
-                for posidx, token in enumerate(sentence):
-                    # add concatenated embedding to sentence
-                    token_idx += 1
+            token_embeddings = self._pool_subtokens(hidden_states, features)
+            if not self.use_scalar_mix and not self.fine_tune:
+                token_embeddings = token_embeddings.cpu()
 
-                    if self.pooling_operation == "first":
-                        # use first subword embedding if pooling operation is 'first'
-                        token.set_embedding(self.name, subtoken_embeddings[token_idx])
-                    else:
-                        # otherwise, do a mean over all subwords in token
-                        embeddings = subtoken_embeddings[
-                            token_idx : token_idx
-                            + feature.token_subtoken_count[token.idx]
-                        ]
-                        embeddings = [
-                            embedding.unsqueeze(0) for embedding in embeddings
-                        ]
-                        try:
-                            mean = torch.mean(torch.cat(embeddings, dim=0), dim=0)
-                        except:
-                            pdb.set_trace()
-                        token.set_embedding(self.name, mean)
-
-                    token_idx += feature.token_subtoken_count[token.idx] - 1
+            # add the pooled embedding to every token of the sentences
+            token_index = 0
+            for sentence in sentences:
+                for token in sentence:
+                    token.set_embedding(self.name, token_embeddings[token_index])
+                    token_index += 1
         if hasattr(sentences, 'features'):
             sentences = self.assign_batch_features(sentences)
         return sentences
@@ -36,7 +36,7 @@ from dadmatools.models.flair.parser.modules import CHAR_LSTM, MLP, BertEmbedding
 from dadmatools.models.flair.parser.modules.dropout import IndependentDropout, SharedDropout
 from dadmatools.models.flair.parser.utils.alg import eisner, crf
 from dadmatools.models.flair.parser.utils.metric import Metric
-from dadmatools.models.flair.parser.utils.fn import ispunct, istree, numericalize_arcs
+from dadmatools.models.flair.parser.utils.fn import ispunct, istree, istree_batch, numericalize_arcs
 # from flair.parser.utils.fn import ispunct
 import torch
 import torch.nn as nn
@@ -464,7 +464,12 @@ class SemanticDependencyParser(flair.nn.Model):
 			self.to(flair.device)
 
 
-	def _init_model_with_state_dict(state, testing = False):
+	def _init_model_with_state_dict(state, testing = False, embeddings = None):
+		# the parser can be built around the embeddings of another model which shares its encoder,
+		# the saved embeddings and their weights are not used then
+		shared_embeddings = embeddings is not None
+		if not shared_embeddings:
+			embeddings = state["embeddings"]
 		use_dropout = 0.0 if not "use_dropout" in state.keys() else state["use_dropout"]
 		use_word_dropout = (
 			0.0 if not "use_word_dropout" in state.keys() else state["use_word_dropout"]
@@ -490,7 +495,7 @@ class SemanticDependencyParser(flair.nn.Model):
 
 		model = SemanticDependencyParser(
 			hidden_size=state["hidden_size"],
-			embeddings=state["embeddings"],
+			embeddings=embeddings,
 			tag_dictionary=state["tag_dictionary"],
 			tag_type=state["tag_type"],
 			use_crf=state["use_crf"],
@@ -536,7 +541,12 @@ class SemanticDependencyParser(flair.nn.Model):
 			testing = testing,
 			is_sdp = False if "is_sdp" not in state else state["is_sdp"],
 		)
-		model.load_state_dict(state["state_dict"])
+		if shared_embeddings:
+			state_dict = {key: value for key, value in state["state_dict"].items() if not key.startswith("embeddings.")}
+			missing_keys, unexpected_keys = model.load_state_dict(state_dict, strict=False)
+			assert not unexpected_keys and all(key.startswith("embeddings.") for key in missing_keys), unexpected_keys
+		else:
+			model.load_state_dict(state["state_dict"])
 		return model
 	def _get_state_dict(self):
 		model_state = {
@@ -588,7 +598,7 @@ class SemanticDependencyParser(flair.nn.Model):
 			"is_sdp": self.is_sdp,
 		}
 		return model_state
-	def forward(self, sentences: List[Sentence], prediction_mode = False):
+	def forward(self, sentences: List[Sentence], prediction_mode = False, rel_scores = True):
 		# self.zero_grad()
 
 		lengths: List[int] = [len(sentence.tokens) for sentence in sentences]
@@ -675,8 +685,13 @@ class SemanticDependencyParser(flair.nn.Model):
 		# get arc and rel scores from the bilinear attention
 		# [batch_size, seq_len, seq_len]
 		s_arc = self.arc_attn(arc_d, arc_h)
-		# [batch_size, seq_len, seq_len, n_rels]
-		s_rel = self.rel_attn(rel_d, rel_h).permute(0, 2, 3, 1)
+		if rel_scores:
+			# [batch_size, seq_len, seq_len, n_rels]
+			s_rel = self.rel_attn(rel_d, rel_h).permute(0, 2, 3, 1)
+		else:
+			# the relations are scored later, only for the heads chosen by the decoder (see score_relations)
+			s_rel = None
+			self.rel_states = (rel_d, rel_h)
 
 		# add second order using mean field variational inference
 		if self.use_second_order:
@@ -1476,11 +1491,11 @@ class SemanticDependencyParser(flair.nn.Model):
 # 		print(batch)
         
 		lines=[]
-		arc_scores, rel_scores = self.forward(batch)
+		arc_scores, _ = self.forward(batch, rel_scores=False)
         
 		mask = self.mask
 		mask=mask.bool()
-		arc_preds, rel_preds, pred_arc_scores, pred_rel_scores = self.decode(arc_scores, rel_scores, mask)
+		arc_preds, rel_preds, pred_arc_scores, pred_rel_scores = self.decode_selected(arc_scores, mask)
         
 		if not self.punct:
 			for sent_id,sentence in enumerate(batch):
@@ -1519,16 +1534,72 @@ class SemanticDependencyParser(flair.nn.Model):
 # 			lines.append("\n")
                 
 		return preds_arcs, preds_rels
-    
-    
-    
+
+	@torch.no_grad()
+	def predict_batch(self, token_lists, mini_batch_size=32, prediction_mode=False):
+		"""
+		Parses many sentences at once. The sentences are sorted by length and fed to the model in padded
+		mini-batches, the heads and relations are returned per sentence in the order of ``token_lists``.
+		"""
+		sentences = []
+		for token_list in token_lists:
+			sentence: Sentence = Sentence()
+			sentence.add_token(Token('<ROOT>', head_id=int(0)))
+			for t in token_list:
+				sentence.add_token(Token(t))
+			sentences.append(sentence)
+		# reverse sort all sequences by their length so that every mini-batch needs little padding
+		order = [idx for idx in sorted(range(len(sentences)), key=lambda x: len(sentences[x]), reverse=True) if len(token_lists[idx]) > 0]
+		preds_arcs = [[] for _ in sentences]
+		preds_rels = [[] for _ in sentences]
+		for start in range(0, len(order), mini_batch_size):
+			batch_ids = order[start : start + mini_batch_size]
+			batch = BatchedData([sentences[idx] for idx in batch_ids])
+			arc_scores, _ = self.forward(batch, rel_scores=False)
+			mask = self.mask.bool()
+			arc_preds, rel_preds, _, _ = self.decode_selected(arc_scores, mask)
+			arc_preds = arc_preds.tolist()
+			rel_preds = rel_preds.tolist()
+			for sent_idx, idx in enumerate(batch_ids):
+				length = len(batch[sent_idx])
+				preds_arcs[idx] = arc_preds[sent_idx][1:length]
+				preds_rels[idx] = [self.tag_dictionary.get_item_for_index(rel) for rel in rel_preds[sent_idx][1:length]]
+		return preds_arcs, preds_rels
+
 	def decode(self, arc_scores, rel_scores, mask):
-		arc_preds = arc_scores.argmax(-1)
-		bad = [not istree(sequence, not self.is_mst)
-			   for sequence in arc_preds.tolist()]
-		if self.tree and any(bad):
+		arc_preds = self.decode_arcs(arc_scores, mask)
+
+		rel_preds = rel_scores.argmax(-1)
+		rel_preds = rel_preds.gather(-1, arc_preds.unsqueeze(-1)).squeeze(-1)
+		# pdb.set_trace()
+		return arc_preds, rel_preds, arc_scores.max(-1)[0] * mask, rel_scores.max(-1)[0].gather(-1, arc_preds.unsqueeze(-1)).squeeze(-1) * mask
+
+	def decode_selected(self, arc_scores, mask):
+		"""
+		decode() after forward(rel_scores=False): the arcs are decoded first and the relations are scored only
+		for the predicted head of each token, O(n*R) instead of the O(n^2*R) relation scores of all the pairs.
+		"""
+		arc_preds = self.decode_arcs(arc_scores, mask)
+		rel_scores = self.score_relations(arc_preds)
+		rel_preds = rel_scores.argmax(-1)
+		return arc_preds, rel_preds, arc_scores.max(-1)[0] * mask, rel_scores.max(-1)[0] * mask
 
-			arc_preds[bad] = eisner(arc_scores[bad], mask[bad])
+	def score_relations(self, arc_preds):
+		"""the relation scores [batch_size, seq_len, n_rels] of the tokens and their heads in arc_preds"""
+		rel_d, rel_h = self.rel_states
+		rel_h = rel_h.gather(1, arc_preds.unsqueeze(-1).expand(-1, -1, rel_h.size(-1)))
+		return self.rel_attn.forward_pairs(rel_d, rel_h).permute(0, 2, 1)
+
+	def decode_arcs(self, arc_scores, mask):
+		arc_preds = arc_scores.argmax(-1)
+		if self.tree:
+			# the root is not a word, it is left out of the tree check and of eisner (as in evaluate)
+			root_mask = mask.clone()
+			root_mask[:, 0] = 0
+			bad = ~istree_batch(arc_preds.cpu().numpy(), root_mask.sum(1).cpu().numpy(), not self.is_mst)
+			if bad.any():
+				bad = torch.from_numpy(bad).to(arc_preds.device)
+				arc_preds[bad] = eisner(arc_scores[bad], root_mask[bad])
 			# if not hasattr(self,'dist') or self.is_mst:
 			#   dist = generate_tree(arc_scores,mask,is_mst=False)
 			# else:
@@ -1540,9 +1611,6 @@ class SemanticDependencyParser(flair.nn.Model):
 			# if not (arc_preds*mask == result*mask).all():
 			#   pdb.set_trace()
 
-		rel_preds = rel_scores.argmax(-1)
-		rel_preds = rel_preds.gather(-1, arc_preds.unsqueeze(-1)).squeeze(-1)
-		# pdb.set_trace()
-		return arc_preds, rel_preds, arc_scores.max(-1)[0] * mask, rel_scores.max(-1)[0].gather(-1, arc_preds.unsqueeze(-1)).squeeze(-1) * mask
+		return arc_preds
 	def get_state(self,):
 		return None
\ No newline at end of file
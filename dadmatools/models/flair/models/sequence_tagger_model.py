@@ -1155,12 +1155,20 @@ class SequenceTagger(flair.nn.Model):
 			distribution = F.softmax(forward_backward_score, dim=-1)
 			_, indices = torch.max(forward_backward_score, -1)
 			sentrange=torch.arange(0,distribution.shape[1]).long()
+		if self.use_crf and not self.predict_posterior:
+			## the whole batch is decoded at once and moved to python lists in one go
+			batch_confidences, batch_tag_seq, batch_scores = self._viterbi_decode_batch(
+				feature[:len(lengths)], lengths, all_scores=get_all_tags,
+			)
+			batch_confidences = batch_confidences.tolist()
+			batch_tag_seq = batch_tag_seq.tolist()
+			batch_scores = batch_scores.tolist() if get_all_tags else None
 		for i, vals in enumerate(zip(feature, lengths)):
 			feats, length=vals
 			if self.use_crf and not self.predict_posterior:
-				confidences, tag_seq, scores = self._viterbi_decode(
-					feats[:length], all_scores=get_all_tags, current_idx = i,
-				)
+				confidences = batch_confidences[i][:length]
+				tag_seq = batch_tag_seq[i][:length]
+				scores = batch_scores[i][:length] if get_all_tags else []
 			else:
 				tag_seq = []
 				confidences = []
@@ -1280,6 +1288,59 @@ class SequenceTagger(flair.nn.Model):
 
 		return best_scores, best_path, scores
 
+	def _viterbi_decode_batch(self, feats, lengths, all_scores: bool = False):
+		"""
+		Viterbi decoding of all the sentences of the batch at once, feats is [batch, seq, tags] and the positions
+		after the length of each sentence are masked. Returns the confidences [batch, seq], the best paths
+		[batch, seq] and, if all_scores is True, the tag distributions [batch, seq, tags] (else None),
+		with the same values as _viterbi_decode for each sentence.
+		"""
+		batch_size, seq_len, tagset_size = feats.shape
+		start_idx = self.tag_dictionary.get_idx_for_item(START_TAG)
+		stop_idx = self.tag_dictionary.get_idx_for_item(STOP_TAG)
+		lengths = torch.as_tensor(lengths, dtype=torch.long, device=feats.device)
+		if self.enhanced_crf:
+			transitions = self.enhanced_transitions[:batch_size]
+		else:
+			transitions = self.transitions.unsqueeze(0)
+
+		forward_var = feats.new_full((batch_size, tagset_size), -1e12)
+		forward_var[:, start_idx] = 0
+		backpointers = feats.new_zeros((batch_size, seq_len, tagset_size), dtype=torch.long)
+		backscores = feats.new_zeros((batch_size, seq_len, tagset_size))
+		for i in range(seq_len):
+			## next_tag_var[b, next, prev]
+			next_tag_var = forward_var.unsqueeze(1) + transitions
+			viterbivars_t, bptrs_t = torch.max(next_tag_var, dim=2)
+			next_forward_var = viterbivars_t + feats[:, i]
+			backscores[:, i] = next_forward_var
+			backpointers[:, i] = bptrs_t
+			forward_var = torch.where((i < lengths).unsqueeze(1), next_forward_var, forward_var)
+
+		terminal_var = forward_var + transitions[:, stop_idx]
+		terminal_var[:, stop_idx] = -1e12
+		terminal_var[:, start_idx] = -1e12
+		best_tag_id = torch.max(terminal_var, dim=1)[1]
+
+		best_path = feats.new_zeros((batch_size, seq_len), dtype=torch.long)
+		for i in reversed(range(seq_len)):
+			best_path[:, i] = best_tag_id
+			prev_tag_id = backpointers[:, i].gather(1, best_tag_id.unsqueeze(1)).squeeze(1)
+			best_tag_id = torch.where(i < lengths, prev_tag_id, best_tag_id)
+		assert (best_tag_id == start_idx).all()
+
+		distribution = F.softmax(backscores, dim=-1)
+		confidences, best_scores_idx = torch.max(distribution, dim=-1)
+
+		scores = None
+		if all_scores:
+			## the scores of the best tag and of the tag in the path are swapped, so the tag in the path has the highest score
+			path_scores = distribution.gather(2, best_path.unsqueeze(2))
+			scores = distribution.scatter(2, best_scores_idx.unsqueeze(2), path_scores)
+			scores = scores.scatter(2, best_path.unsqueeze(2), confidences.unsqueeze(2))
+
+		return confidences, best_path, scores
+
 	def _forward_alg(self, feats, lens_, distill_mode=False, T = 1):
 
 		init_alphas = torch.FloatTensor(self.tagset_size).fill_(-1e12)
@@ -2334,7 +2395,39 @@ class FastSequenceTagger(SequenceTagger):
 				features = self.forward([sentence],prediction_mode=prediction_mode)
 				tags, _ = self._obtain_labels(features, [sentence])
 		return tags
-        
+
+	def predict_batch(
+		self,
+		token_lists,
+		mini_batch_size = 32,
+		embeddings_storage_mode: str = "none",
+		prediction_mode = True,
+	):
+		"""
+		Tags many sentences at once. The sentences are sorted by length and fed to the model in padded
+		mini-batches, the predicted labels are returned in the order of ``token_lists``.
+		"""
+		self.selection=torch.FloatTensor([1.,0.])
+		sentences = []
+		for token_list in token_lists:
+			sentence: Sentence = Sentence()
+			for t in token_list:
+				sentence.add_token(Token(t))
+			sentences.append(sentence)
+		# reverse sort all sequences by their length so that every mini-batch needs little padding
+		order = [idx for idx in sorted(range(len(sentences)), key=lambda x: len(sentences[x]), reverse=True) if len(sentences[idx]) > 0]
+		tags = [[] for _ in sentences]
+		with torch.no_grad():
+			for start in range(0, len(order), mini_batch_size):
+				batch_ids = order[start : start + mini_batch_size]
+				batch = [sentences[idx] for idx in batch_ids]
+				features = self.forward(batch,prediction_mode=prediction_mode)
+				batch_tags, _ = self._obtain_labels(features, batch)
+				for idx, sent_tags in zip(batch_ids, batch_tags):
+					tags[idx] = sent_tags
+				store_embeddings(batch, storage_mode=embeddings_storage_mode)
+		return tags
+
         
 	def evaluate_langatt(
 		self,
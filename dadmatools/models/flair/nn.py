@@ -89,10 +89,11 @@ class Model(torch.nn.Module):
         torch.save(model_state, str(model_file), pickle_protocol=4)
 
     @classmethod
-    def load(cls, model: Union[str, Path], device = flair.device):
+    def load(cls, model: Union[str, Path], device = flair.device, **kwargs):
         """
         Loads the model from the given file.
         :param model_file: the model file
+        :param kwargs: passed to _init_model_with_state_dict (e.g. the embeddings of a parser sharing its encoder)
         :return: the loaded text classifier model
         """
         model_file = cls._fetch_model(str(model))
@@ -104,7 +105,7 @@ class Model(torch.nn.Module):
             f = flair.file_utils.load_big_file(str(model_file))
             state = torch.load(f, map_location=device)
 
-        model = cls._init_model_with_state_dict(state, testing = device=='cpu')
+        model = cls._init_model_with_state_dict(state, testing = device=='cpu', **kwargs)
         
         model.eval()
         model.to(device)
@@ -49,3 +49,20 @@ class Biaffine(nn.Module):
         s = s.squeeze(1)
 
         return s
+
+    def forward_pairs(self, x, y):
+        r'''Scores only the pairs (x[b, i], y[b, i]) instead of all the (x[b, i], y[b, j]) pairs,
+        returns [batch_size, n_out, seq_len] (the diagonal of forward(x, y)).'''
+        if self.bias_x:
+            x = torch.cat((x, torch.ones_like(x[..., :1])), -1)
+        if self.bias_y:
+            y = torch.cat((y, torch.ones_like(y[..., :1])), -1)
+        # [batch_size, n_out, seq_len]
+        if self.diagonal:
+            s = torch.einsum('bxi,bxi,oi->box', x, y, self.weight)
+        else:
+            s = torch.einsum('bxi,oij,bxj->box', x, self.weight, y)
+        # remove dim 1 if n_out == 1
+        s = s.squeeze(1)
+
+        return s
@@ -2,6 +2,7 @@
 
 from dadmatools.models.flair.parser.utils.fn import pad, stripe
 
+import numpy as np
 import torch
 import torch.autograd as autograd
 
@@ -216,25 +217,31 @@ def eisner(scores, mask):
         s_c[0, w][lens.ne(w)] = float('-inf')
         p_c.diagonal(w).copy_(cr_path + starts + 1)
 
-    def backtrack(p_i, p_c, heads, i, j, complete):
+    # the back-pointers are moved to numpy once, reading CPU tensors element by element is slow
+    p_c = p_c.permute(2, 0, 1).cpu().numpy()
+    p_i = p_i.permute(2, 0, 1).cpu().numpy()
+    preds = torch.zeros(batch_size, seq_len, dtype=torch.long)
+    for i, length in enumerate(lens.tolist()):
+        preds[i, :length + 1] = torch.from_numpy(backtrack(p_i[i], p_c[i], length))
+
+    return preds.to(mask.device)
+
+
+def backtrack(p_i, p_c, length):
+    # iterative backtracking of the eisner back-pointers of a sentence, the spans to expand are kept in a stack
+    heads = np.zeros(length + 1, dtype=np.int64)
+    stack = [(0, length, True)]
+    while stack:
+        i, j, complete = stack.pop()
         if i == j:
-            return
+            continue
         if complete:
             r = p_c[i, j]
-            backtrack(p_i, p_c, heads, i, r, False)
-            backtrack(p_i, p_c, heads, r, j, True)
+            stack.append((r, j, True))
+            stack.append((i, r, False))
         else:
             r, heads[j] = p_i[i, j], i
             i, j = sorted((i, j))
-            backtrack(p_i, p_c, heads, i, r, True)
-            backtrack(p_i, p_c, heads, j, r + 1, True)
-
-    preds = []
-    p_c = p_c.permute(2, 0, 1).cpu()
-    p_i = p_i.permute(2, 0, 1).cpu()
-    for i, length in enumerate(lens.tolist()):
-        heads = p_c.new_zeros(length + 1, dtype=torch.long)
-        backtrack(p_i[i], p_c[i], heads, 0, length, True)
-        preds.append(heads.to(mask.device))
-
-    return pad(preds, total_length=seq_len).to(mask.device)
+            stack.append((j, r + 1, True))
+            stack.append((i, r, True))
+    return heads
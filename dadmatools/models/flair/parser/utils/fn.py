@@ -2,6 +2,8 @@
 
 import unicodedata
 
+import numpy as np
+
 def ispunct(token):
     return all(unicodedata.category(char).startswith('P')
                for char in token)
@@ -43,6 +45,46 @@ def istree(sequence, proj=False):
     return proj and (next(tarjan(sequence), None) is None)
 
 
+def istree_batch(sequences, lens, proj=False):
+    r'''Vectorized istree over a batch.
+    Parameters:
+        sequences (ndarray): [batch_size, seq_len] heads, position 0 is the root.
+        lens (ndarray): [batch_size] the number of words (without the root) of each sentence.
+        proj (bool): if True the trees must be projective too.
+    Returns a bool array which is True for the sentences whose heads form a tree,
+    the positions after the length of each sentence are ignored.
+    As in istree, a word which is its own head is not taken as a cycle.
+    '''
+    sequences, lens = np.asarray(sequences), np.asarray(lens)
+    batch_size, seq_len = sequences.shape
+    positions = np.broadcast_to(np.arange(seq_len), sequences.shape)
+    words = (positions >= 1) & (positions <= lens[:, None])
+    heads = np.where(words, sequences, 0)
+    inside = ((heads >= 0) & (heads <= lens[:, None])).all(1)
+    heads = np.where(inside[:, None] & (heads != positions), heads, 0)
+    # after ceil(log2(seq_len)) squarings the ancestors are 2^k steps up, only the words in a cycle miss the root
+    ancestors = heads
+    for _ in range(int(np.ceil(np.log2(max(seq_len, 2))))):
+        ancestors = np.take_along_axis(ancestors, ancestors, 1)
+    trees = inside & (ancestors == 0).all(1)
+    if proj:
+        trees &= ~crossing_arcs(np.where(words, sequences, -1), positions).any((1, 2))
+    return trees
+
+
+def crossing_arcs(heads, positions):
+    # the pairs of arcs which isprojective rejects, the arcs of heads below 0 are ignored
+    arcs = heads >= 0
+    left, right = np.minimum(heads, positions), np.maximum(heads, positions)
+    li, ri, hi, di = (x[:, :, None] for x in (left, right, heads, positions))
+    lj, rj, hj, dj = (x[:, None, :] for x in (left, right, heads, positions))
+    crossing = ((li <= hj) & (hj <= ri) & (hi == dj)) | ((lj <= hi) & (hi <= rj) & (hj == di))
+    crossing |= (((li < lj) & (lj < ri)) | ((li < rj) & (rj < ri))) & ((li - lj) * (ri - rj) > 0)
+    crossing &= arcs[:, :, None] & arcs[:, None, :]
+    crossing &= ~np.eye(heads.shape[1], dtype=bool)
+    return crossing
+
+
 def stripe(x, n, w, offset=(0, 0), dim=1):
     r'''Returns a diagonal stripe of the tensor.
     Parameters:
@@ -32,6 +32,7 @@ from dadmatools.models.common.doc import *
 
 from dadmatools.models.common.doc import Document
 
+from dadmatools.models.common.utils import eval_mode, inference
 import dadmatools.pipeline.download as dl
 
 logger = logging.getLogger('stanza')
@@ -69,6 +70,7 @@ def parse_args():
         'decay_epoch':30, 
         'num_epoch':60,
         'batch_size':50, 
+        'lexicon_first':True,
         'max_grad_norm':0.5,
         'log_step':20,
         'seed':1234,
@@ -164,8 +166,10 @@ def load_model():
     trainer = Trainer(model_file=args['save_dir'], use_cuda=use_cuda)
     loaded_args, vocab = trainer.args, trainer.vocab
     
+    eval_mode(trainer)
     return (trainer, args)
 
+@inference
 def lemma(trainer, args, input_tokens):
     
     loaded_args, vocab = trainer.args, trainer.vocab
@@ -173,31 +177,51 @@ def lemma(trainer, args, input_tokens):
     input_dict = [[{"text": t} for t in l] for l in input_tokens]
     # doc = CoNLL.rawText2doc(input_dict)
     doc = Document(input_dict, text=None, comments=None)
-    batch = DataLoader(doc, args['batch_size'], loaded_args, vocab=vocab, evaluation=True)
+    pairs = [tuple(pair) for pair in doc.get([TEXT, UPOS])]
     
     # skip eval if dev data does not exist
-    if len(batch) == 0:
+    if len(pairs) == 0:
         logger.warning("there are no inputs")
         return
     
-    dict_preds = trainer.predict_dict(batch.doc.get([TEXT, UPOS]))
-    
     if loaded_args.get('dict_only', False):
-        preds = dict_preds
+        return trainer.predict_dict(pairs)
+    
+    ## the lexicon overrides the seq2seq predictions of known words when ensembling, so only the unknown words
+    ## (each distinct one once) are decoded
+    lexicon_first = args.get('lexicon_first', True) and loaded_args.get('ensemble_dict', False)
+    if lexicon_first:
+        known = trainer.skip_seq2seq(pairs)
+        first_index = {}
+        skip = []
+        for i, (pair, is_known) in enumerate(zip(pairs, known)):
+            skip.append(is_known or pair in first_index)
+            if not skip[-1]:
+                first_index[pair] = i
     else:
+        skip = None
+    batch = DataLoader(doc, args['batch_size'], loaded_args, vocab=vocab, evaluation=True, skip=skip)
+    
 #         logger.info("Running the seq2seq model...")
-        preds = []
-        edits = []
-        for i, b in enumerate(batch):
-            ps, es = trainer.predict(b, args['beam_size'])
-            preds += ps
-            if es is not None:
-                edits += es
-        preds = trainer.postprocess(batch.doc.get([TEXT]), preds, edits=edits)
-        
-        if loaded_args.get('ensemble_dict', False):
-            logger.info("[Ensembling dict with seq2seq lemmatizer...]")
-            preds = trainer.ensemble(batch.doc.get([TEXT, UPOS]), preds)
+    preds = []
+    edits = []
+    for i, b in enumerate(batch):
+        ps, es = trainer.predict(b, args['beam_size'])
+        preds += ps
+        if es is not None:
+            edits += es
+    
+    if lexicon_first:
+        words = [w for (w, _), s in zip(pairs, skip) if not s]
+        decoded = dict(zip(first_index, trainer.postprocess(words, preds, edits=edits)))
+        ## the lexicon entries are filled in by ensemble
+        preds = [decoded.get(pair, '') for pair in pairs]
+    else:
+        preds = trainer.postprocess([w for w, _ in pairs], preds, edits=edits)
+    
+    if loaded_args.get('ensemble_dict', False):
+        logger.info("[Ensembling dict with seq2seq lemmatizer...]")
+        preds = trainer.ensemble(pairs, preds)
     
     return preds
 
@@ -11,6 +11,8 @@ import torch
 import numpy as np
 import random
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 from dadmatools.models.mwt.data import DataLoader
@@ -25,6 +27,9 @@ from dadmatools.utils.conll import CoNLL
 # logger = logging.getLogger('stanza')
 import dadmatools.pipeline.download as dl
 
+## the number of expanded surface forms kept by an MWTEngine, the least recently used ones are evicted first
+MAX_MEMO_SIZE = 100000
+
 def parse_args():
     args = {
         'mode':'predict',
@@ -72,26 +77,83 @@ def load_model():
         if k.endswith('_dir') or k.endswith('_file') or k in ['shorthand']:
             loaded_args[k] = args[k]
     
-    return (trainer, args)
+    return MWTEngine(trainer, args)
+
+class MWTEngine:
+    """
+    A loaded MWT expander which expands all the multi-word tokens of many sentences in a single pass of the model.
+    The expansion only depends on the surface form, so the expansions are memoized in a bounded LRU memo which is
+    guarded by a lock, as the engine is shared by the pipelines of the process.
+    Unpacking it gives (trainer, args), as the tuple returned by load_model() used to.
+    """
+    def __init__(self, trainer, args, max_memo_size=MAX_MEMO_SIZE):
+        self.trainer = trainer
+        self.args = args
+        self.max_memo_size = max_memo_size
+        self.memo = OrderedDict()
+        self.memo_lock = threading.Lock()
+        utils.eval_mode(trainer)
+
+    def __iter__(self):
+        return iter((self.trainer, self.args))
+
+    def lookup(self, texts):
+        '''the memoized expansions of the texts which have one'''
+        found = {}
+        with self.memo_lock:
+            for text in texts:
+                expansion = self.memo.get(text)
+                if expansion is not None:
+                    self.memo.move_to_end(text)
+                    found[text] = expansion
+        return found
+
+    def remember(self, expansions):
+        with self.memo_lock:
+            for text, expansion in expansions.items():
+                self.memo[text] = expansion
+                self.memo.move_to_end(text)
+            while len(self.memo) > self.max_memo_size:
+                self.memo.popitem(last=False)
+
+    def expand(self, candidates):
+        '''expands the {text: misc} candidates in a single pass, an {text: expansion} dict is returned'''
+        loaded_args, vocab = self.trainer.args, self.trainer.vocab
+        doc = Document([[{"text": text, "misc": misc}] for text, misc in candidates.items()], text=None, comments=None)
+        batch = DataLoader(doc, self.args['batch_size'], loaded_args, vocab=vocab, evaluation=True)
+        preds = []
+        with utils.inference_context():
+            for i, b in enumerate(batch):
+                preds += self.trainer.predict(b)
+            if loaded_args.get('ensemble_dict', False):
+                preds = self.trainer.ensemble(batch.doc.get_mwt_expansions(evaluation=True), preds)
+        return dict(zip(candidates, preds))
+
+    def expand_many(self, input_tokens):
+        '''input_tokens is a list of sentences of (token, misc) pairs, the words of every sentence are returned'''
+        candidates = {}
+        for l in input_tokens:
+            for t in l:
+                if t[1] != 'MWT=No':
+                    candidates.setdefault(t[0], t[1])
+        expansions = self.lookup(candidates)
+        ## all the new multi-word tokens of the input are expanded in a single pass
+        new_candidates = {text: misc for text, misc in candidates.items() if text not in expansions}
+        if len(new_candidates) > 0:
+            new_expansions = self.expand(new_candidates)
+            self.remember(new_expansions)
+            expansions.update(new_expansions)
+
+        new_preds = []
+        for l in input_tokens:
+            tmp = []
+            for t in l:
+                if t[1] != 'MWT=No':
+                    tmp.extend(expansions[t[0]].split(' '))
+                else:
+                    tmp.append(t[0])
+            new_preds.append(tmp)
+        return new_preds
 
 def mwt(trainer, args, input_tokens):
-    loaded_args, vocab = trainer.args, trainer.vocab
-    
-    new_preds = []
-    for l in input_tokens:
-        tmp = []
-        for t in l:
-            if t[1] != 'MWT=No':
-                doc = Document([[{"text": t[0], "misc": t[1]}]], text=None, comments=None)
-                batch = DataLoader(doc, args['batch_size'], loaded_args, vocab=vocab, evaluation=True)
-                preds = []
-                for i, b in enumerate(batch):
-                    preds += trainer.predict(b)
-                if loaded_args.get('ensemble_dict', False):
-                    preds = trainer.ensemble(batch.doc.get_mwt_expansions(evaluation=True), preds)
-                tmp.extend(preds[0].split(' '))
-            else:
-                tmp.append(t[0])
-        new_preds.append(tmp)
-    
-    return new_preds
+    return MWTEngine(trainer, args).expand_many(input_tokens)
@@ -8,14 +8,119 @@ import torch
 
 from pathlib import Path
 
+from dadmatools.models.common.utils import eval_mode, inference
 import dadmatools.pipeline.download as dl
 
+## the word pieces cache of the NEREngine is cleared when it gets larger than this
+MAX_CACHE_SIZE = 100000
+## the models of the RoBERTa family number the positions after the padding index
+PADDED_POSITIONS_MODELS = {'roberta', 'xlm-roberta', 'camembert'}
+
 def get_config():
     config = {
         'save_dir':'saved_models/ner/ner/'
     }
     return config
 
+def max_positions(config):
+    '''the number of positions the model can encode'''
+    if getattr(config, 'model_type', None) in PADDED_POSITIONS_MODELS:
+        return config.max_position_embeddings - config.pad_token_id - 1
+    return config.max_position_embeddings
+
+class NEREngine:
+    """
+    A loaded NER model which tags many sentences of DadmaTools tokens at once: the tokens are split into word
+    pieces, the sentences are encoded together in padded mini-batches and the label of the first piece of every
+    token is taken as its label. Sentences longer than the model are tagged in overlapping windows.
+    Unpacking it gives (model, tokenizer, labels), as the tuple returned by load_model() used to.
+    """
+    def __init__(self, model, tokenizer, labels, batch_size=32, stride=64):
+        self.model = eval_mode(model)
+        self.tokenizer = tokenizer
+        self.labels = labels
+        self.batch_size = batch_size
+        self.stride = stride
+        ## the [CLS] and [SEP] pieces are added to every window, the max length of a tokenizer saved without one
+        ## is a huge sentinel so the position embeddings of the model bound it too
+        self.max_pieces = min(tokenizer.model_max_length, max_positions(model.config)) - tokenizer.num_special_tokens_to_add()
+        self.pieces_cache = {}
+
+    def __iter__(self):
+        return iter((self.model, self.tokenizer, self.labels))
+
+    def token_pieces(self, token):
+        '''the ids of the word pieces of a token, the pieces of the frequent tokens are cached'''
+        pieces = self.pieces_cache.get(token)
+        if pieces is None:
+            pieces = self.tokenizer.convert_tokens_to_ids(self.tokenizer.tokenize(token))
+            if len(self.pieces_cache) > MAX_CACHE_SIZE:
+                self.pieces_cache.clear()
+            self.pieces_cache[token] = pieces
+        return pieces
+
+    def windows(self, num_pieces):
+        '''
+        splits the pieces of a sentence into windows of at most max_pieces overlapping by stride pieces,
+        every piece is owned by one window (the overlaps are split in the middle).
+        returns (start, end, own_start, own_end) tuples.
+        '''
+        if num_pieces <= self.max_pieces:
+            return [(0, num_pieces, 0, num_pieces)]
+        step = self.max_pieces - min(self.stride, self.max_pieces // 2)
+        starts = list(range(0, num_pieces - self.max_pieces, step)) + [num_pieces - self.max_pieces]
+        windows = []
+        for i, start in enumerate(starts):
+            end = start + self.max_pieces
+            own_start = 0 if i == 0 else windows[-1][3]
+            own_end = num_pieces if i == len(starts) - 1 else (starts[i+1] + end) // 2
+            windows.append((start, end, own_start, own_end))
+        return windows
+
+    @inference
+    def tag_many(self, sentences):
+        '''sentences is a list of token lists, a list of (token, label) pairs is returned for each sentence'''
+        tokenizer = self.tokenizer
+        device = next(self.model.parameters()).device
+
+        ## the pieces of every sentence, the index of the first piece of every token and the windows to encode
+        sents_pieces, sents_first_pieces, chunks = [], [], []
+        for sent_idx, tokens in enumerate(sentences):
+            pieces, first_pieces = [], []
+            for token in tokens:
+                token_pieces = self.token_pieces(token)
+                first_pieces.append(len(pieces) if token_pieces else -1)
+                pieces.extend(token_pieces)
+            sents_pieces.append(pieces)
+            sents_first_pieces.append(first_pieces)
+            for window in self.windows(len(pieces)):
+                chunks.append((sent_idx,) + window)
+
+        piece_labels = [[0] * len(pieces) for pieces in sents_pieces]
+        ## the windows are sorted by length so that every mini-batch needs little padding
+        chunks.sort(key=lambda chunk: chunk[2] - chunk[1], reverse=True)
+        for batch_start in range(0, len(chunks), self.batch_size):
+            batch = chunks[batch_start:batch_start + self.batch_size]
+            max_len = batch[0][2] - batch[0][1] + 2
+            input_ids = torch.full((len(batch), max_len), tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+            for i, (sent_idx, start, end, _, _) in enumerate(batch):
+                ids = [tokenizer.cls_token_id] + sents_pieces[sent_idx][start:end] + [tokenizer.sep_token_id]
+                input_ids[i, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+                attention_mask[i, :len(ids)] = 1
+            outputs = self.model(input_ids=input_ids.to(device), attention_mask=attention_mask.to(device))[0]
+            predictions = outputs.argmax(-1).tolist()
+            for i, (sent_idx, start, end, own_start, own_end) in enumerate(batch):
+                ## +1 skips the [CLS] piece
+                piece_labels[sent_idx][own_start:own_end] = predictions[i][own_start - start + 1:own_end - start + 1]
+
+        results = []
+        for tokens, first_pieces, labels in zip(sentences, sents_first_pieces, piece_labels):
+            ## a token without any piece (e.g. only control characters) is not an entity
+            results.append([(token, self.labels[labels[first]] if first >= 0 else 'O') for token, first in zip(tokens, first_pieces)])
+        return results
+
+
 def load_model():
     dl.download_model('ner', process_func=dl._unzip_process_func)
     
@@ -29,19 +134,24 @@ def load_model():
     model = AutoModelForTokenClassification.from_pretrained(model_name)
     labels = list(config.label2id.keys())
 
-    nlp = (model, tokenizer, labels)
-    
-    return nlp
+    return NEREngine(model, tokenizer, labels)
 
+@inference
 def ner(nlp, sentence):
     # sentence = normalizer.normalize(sentence)
 
     model, tokenizer, labels = nlp
     
-    tokens = tokenizer.tokenize(tokenizer.decode(tokenizer.encode(sentence)))
+    ## the sentence is encoded once, the word pieces are read back from the ids
     inputs = tokenizer.encode(sentence, return_tensors="pt")
+    tokens = tokenizer.convert_ids_to_tokens(inputs[0].tolist())
     outputs = model(inputs)[0]
     predictions = torch.argmax(outputs, axis=2)
-    predictions = [(token, labels[prediction]) for token, prediction in zip(tokens, predictions[0].numpy())]
-    
+    predictions = [(token, labels[prediction]) for token, prediction in zip(tokens, predictions[0].tolist())]
+
     return predictions
+
+def ner_batch(nlp, sentences):
+    '''sentences stores list of all sentences of the batch e.g. sentences = [['this', 'is', 'a', 'test', '.'], ['another', 'one']]
+    for each sentence a list of (token, label) pairs aligned with its tokens is returned'''
+    return nlp.tag_many(sentences)
@@ -0,0 +1,70 @@
+"""
+Plain text extraction from HTML, based on the stdlib html.parser.
+"""
+
+from html.parser import HTMLParser
+
+
+# tags whose content is not text, the head is not skipped as a whole since its end tag can be left out
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'title', 'svg', 'math'}
+# tags which end a line of text
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'td', 'th', 'tr', 'ul',
+}
+
+
+class HTMLStripper(HTMLParser):
+    """
+    Incremental HTML to text converter: the page can be fed in chunks of any size, the content of script and style
+    tags is dropped, entities are decoded and block tags are turned into newlines.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if self.skip_depth == 0:
+            self.parts.append(data)
+
+    def pop_text(self):
+        """ Returns the text extracted since the last call. """
+        text = ''.join(self.parts)
+        self.parts = []
+        return text
+
+
+def iter_strip_html(chunks):
+    """ Converts an HTML page given as an iterable of chunks, the text is yielded as soon as it is parsed. """
+    stripper = HTMLStripper()
+    for chunk in chunks:
+        stripper.feed(chunk)
+        text = stripper.pop_text()
+        if text:
+            yield text
+    stripper.close()
+    text = stripper.pop_text()
+    if text:
+        yield text
+
+def strip_html(html):
+    """ Converts an HTML string to plain text. """
+    return ''.join(iter_strip_html([html]))
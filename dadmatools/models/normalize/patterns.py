@@ -74,6 +74,15 @@ URL_REGEX = re.compile(
     flags=re.UNICODE | re.IGNORECASE,
 )
 
+# cheap necessary conditions of the heavy masking patterns above, a pattern only runs on texts where its trigger is found
+PATTERN_TRIGGERS = {
+    EMAIL_REGEX: re.compile(r"@|[(<{\[]at[)>}\]]", flags=re.IGNORECASE),
+    URL_REGEX: re.compile(r"://|www", flags=re.IGNORECASE),
+    MOBILE_PHONE_REGEX: re.compile(r"\d{10}"),
+    HOME_PHONE_REGEX: re.compile(r"\d{8}"),
+    NUMBERS_REGEX: re.compile(r"\d"),
+}
+
 
 strange_double_quotes = [
     "«",
@@ -164,8 +173,7 @@ PUNC_SPACING_PATTERNS = [
 				('([^ '+ punc_before +'])(['+ punc_before +'])', r'\1 \2'),  # put space before
 			]
 REMOVE_SPACE_PATTERNS = [
-                            (r'( )+', r' '),
-                            (r'(\n)+',  r'\n')
+                            (r'([ \n])\1+', r'\1'),  # runs of spaces or of newlines to one
                         ]
 
 PUNCS_REGEX = r'\.:!،؛؟»\]\)\}«\[\(\{'
@@ -1,7 +1,11 @@
+import os
 import string
+import functools
+import multiprocessing
+from collections import deque
 from pathlib import Path
 from dadmatools.models.normalize.patterns import *
-import html2text
+from dadmatools.models.normalize.html_stripper import strip_html
 
 # import dadmatools.pipeline.download as dl
 
@@ -10,6 +14,51 @@ prefix = str(Path(__file__).parent.absolute()).replace('models', '')
 # save_dir = 'saved_models/normalizer/normalize/'
 save_dir = 'models/normalize/'
 
+@functools.lru_cache(maxsize=None)
+def load_stopwords():
+    """ The stopword lexicon, read once per process and shared by all the normalizers. """
+    with open(prefix+save_dir+'stopwords-fa.py', encoding='utf-8') as f:
+        return frozenset(f.read().splitlines())
+
+def char_rule(pattern, repl):
+    """
+    Returns the source characters of a rule which only replaces single characters with a fixed string
+    (e.g. r"ﺐ|ﺏ|ﺑ" -> r"ب"), or None for the other rules.
+    """
+    if not isinstance(pattern, str) or not isinstance(repl, str) or '\\' in repl:
+        return None
+    chars = pattern.split('|')
+    if all(len(c) == 1 and re.escape(c) == c for c in chars):
+        return chars
+    return None
+
+def compile_replace_plan(patterns):
+    """
+    Compiles the (pattern, repl) rules into the (pattern, repl, trigger) steps applied by Normalizer.replace_text.
+    Each run of consecutive character rules becomes one str.translate table (a step with None as pattern) giving
+    the same output as applying them one after another, the other rules are compiled as regex and are skipped
+    when their trigger (from PATTERN_TRIGGERS) is not found in the text.
+    """
+    plan = []
+    table = None
+    for pattern, repl in patterns:
+        chars = char_rule(pattern, repl)
+        if chars is None:
+            table = None
+            plan.append((re.compile(pattern), repl, PATTERN_TRIGGERS.get(pattern)))
+            continue
+        if table is None:
+            table = {}
+            plan.append((None, table, None))
+        # the rule also applies to the output of the previous rules of the run
+        rule = {ord(c): repl for c in chars}
+        for code, value in table.items():
+            table[code] = ''.join(rule.get(ord(c), c) for c in value)
+        for code, value in rule.items():
+            table.setdefault(code, value)
+    return plan
+
+
 class Normalizer:
     def __init__(self,
              full_cleaning=False,
@@ -30,7 +79,7 @@ class Normalizer:
         self.remove_html = remove_html
         self.remove_puncs = remove_puncs
         self.remove_stop_word = remove_stop_word
-        self.STOPWORDS = open(prefix+save_dir+'stopwords-fa.py').read().splitlines()
+        self.STOPWORDS = load_stopwords()
         self.PUNCS = string.punctuation.replace('<', '').replace('>', '') + '،؟'
         if full_cleaning:
             self.remove_html = True
@@ -62,6 +111,8 @@ class Normalizer:
         if refine_punc_spacing or full_cleaning:
             self.replace_patterns.extend(PUNC_SPACING_PATTERNS)
 
+        # the plan applied by replace_text, with the character to character rules folded into translate tables
+        self.replace_plan = compile_replace_plan(self.replace_patterns)
         # compile
         for index, (pattern, repl) in enumerate(self.replace_patterns):
             self.replace_patterns[index] = (re.compile(pattern), repl)
@@ -69,9 +120,12 @@ class Normalizer:
 
     def replace_text(self, text):
         if self.remove_html:
-            text = html2text.html2text(text)
-        for pattern, repl in self.replace_patterns:
-            text = pattern.sub(repl, text)
+            text = strip_html(text)
+        for pattern, repl, trigger in self.replace_plan:
+            if pattern is None:
+                text = text.translate(repl)
+            elif trigger is None or trigger.search(text) is not None:
+                text = pattern.sub(repl, text)
         return text
 
     def normalize(self, text):
@@ -87,6 +141,55 @@ class Normalizer:
         text = ' '.join(tokens)
         return text
 
+    def normalize_many(self, texts, n_jobs=1, chunksize=256):
+        """
+        Normalizes an iterable of texts lazily, the outputs are yielded in the input order.
+        With n_jobs > 1 (or -1 for all the cores) the texts are sent in chunks of chunksize to a pool of processes,
+        at most 2 * n_jobs chunks are in flight so large inputs are streamed with bounded memory.
+        """
+        if n_jobs is None or n_jobs == 1:
+            for text in texts:
+                yield self.normalize(text)
+            return
+        if n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        with multiprocessing.Pool(n_jobs, initializer=_init_worker, initargs=(self,)) as pool:
+            pending = deque()
+            for chunk in _chunks(texts, chunksize):
+                pending.append(pool.apply_async(_normalize_chunk, (chunk,)))
+                if len(pending) >= 2 * n_jobs:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+
+    def normalize_file(self, in_path, out_path, n_jobs=1, chunksize=256, encoding='utf-8'):
+        """ Normalizes a text file line by line into out_path, see normalize_many for n_jobs and chunksize. """
+        with open(in_path, encoding=encoding) as fin, open(out_path, 'w', encoding=encoding) as fout:
+            lines = (line.rstrip('\n') for line in fin)
+            for text in self.normalize_many(lines, n_jobs=n_jobs, chunksize=chunksize):
+                fout.write(text + '\n')
+
+
+## the normalizer of each worker process of normalize_many
+_worker_normalizer = None
+
+def _init_worker(normalizer):
+    global _worker_normalizer
+    _worker_normalizer = normalizer
+
+def _normalize_chunk(texts):
+    return [_worker_normalizer.normalize(text) for text in texts]
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
 def load_model():
     normalizer = Normalizer()
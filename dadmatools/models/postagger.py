@@ -7,6 +7,7 @@ from dadmatools.models.flair.list_data import ListCorpus
 import torch
 from pathlib import Path
 
+from dadmatools.models.common.utils import eval_mode, inference
 import dadmatools.pipeline.download as dl
 
 def get_config():
@@ -146,10 +147,18 @@ def load_model():
     student=create_model(config)
     # base_path=Path(config['target_dir'])/config['model_name']
     
-    return student
+    return eval_mode(student)
 
+@inference
 def postagger(model, tokens_list):
     preds = model.predict(tokens_list, embeddings_storage_mode="none",prediction_mode=True)
     preds = [p.value for p in preds[0]]## removing the score for each token tag prediction
     return preds
 
+@inference
+def postagger_batch(model, sentences):
+    '''sentences stores list of all sentences of the batch e.g. sentences = [['this', 'is', 'a', 'test', '.'], ['another', 'one']]'''
+    preds = model.predict_batch(sentences, embeddings_storage_mode="none", prediction_mode=True)
+    preds = [[p.value for p in sent] for sent in preds]## removing the score for each token tag prediction
+    return preds
+
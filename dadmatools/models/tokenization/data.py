@@ -26,6 +26,27 @@ NEWLINE_WHITESPACE_RE = re.compile(r'\n\s*\n')
 NUMERIC_RE = re.compile(r'^([\d]+[,\.]*)+$')
 WHITESPACE_RE = re.compile(r'\s')
 
+FEATURE_FUNCS = {
+    'space_before': lambda x: 1 if x.startswith(' ') else 0,
+    'capitalized': lambda x: 1 if x[0].isupper() else 0,
+    'all_caps': lambda x: 1 if x.isupper() else 0,
+    'numeric': lambda x: 1 if (NUMERIC_RE.match(x) is not None) else 0,
+}
+
+def build_featurizer(feat_funcs):
+    """ Stack the unit-level feature functions, position-dependent features are added by the caller. """
+    funcs = []
+    for feat_func in feat_funcs:
+        if feat_func == 'end_of_para' or feat_func == 'start_of_para':
+            # skip for position-dependent features
+            continue
+        if feat_func not in FEATURE_FUNCS:
+            raise Exception('Feature function "{}" is undefined.'.format(feat_func))
+        funcs.append(FEATURE_FUNCS[feat_func])
+
+    # stacking all featurize functions
+    return lambda x: [f(x) for f in funcs]
+
 
 class DataLoader:
     def __init__(self, args, input_files={'txt': None, 'label': None}, input_text=None, input_data=None, vocab=None, evaluation=False):
@@ -63,6 +84,7 @@ class DataLoader:
         self.data = [filter_consecutive_whitespaces(x) for x in self.data]
 
         self.vocab = vocab if vocab is not None else self.init_vocab()
+        self.featurize = build_featurizer(self.args['feat_funcs'])
 
         # data comes in a list of paragraphs, where each paragraph is a list of units with unit-level labels.
         # At evaluation time, each paragraph is treated as single "sentence" as we don't know a priori where
@@ -98,26 +120,7 @@ class DataLoader:
     def para_to_sentences(self, para):
         """ Convert a paragraph to a list of processed sentences. """
         res = []
-        funcs = []
-        for feat_func in self.args['feat_funcs']:
-            if feat_func == 'end_of_para' or feat_func == 'start_of_para':
-                # skip for position-dependent features
-                continue
-            if feat_func == 'space_before':
-                func = lambda x: 1 if x.startswith(' ') else 0
-            elif feat_func == 'capitalized':
-                func = lambda x: 1 if x[0].isupper() else 0
-            elif feat_func == 'all_caps':
-                func = lambda x: 1 if x.isupper() else 0
-            elif feat_func == 'numeric':
-                func = lambda x: 1 if (NUMERIC_RE.match(x) is not None) else 0
-            else:
-                raise Exception('Feature function "{}" is undefined.'.format(feat_func))
-
-            funcs.append(func)
-
-        # stacking all featurize functions
-        composite_func = lambda x: [f(x) for f in funcs]
+        composite_func = self.featurize
 
         def process_sentence(sent):
             return [self.vocab.unit2id(y[0]) for y in sent], [y[1] for y in sent], [y[2] for y in sent], [y[0] for y in sent]
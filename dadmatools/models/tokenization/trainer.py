@@ -55,6 +55,7 @@ class Trainer(BaseTrainer):
 
         return loss.item()
 
+    @torch.no_grad()
     def predict(self, inputs):
         self.model.eval()
         units, labels, features, _ = inputs
@@ -67,6 +67,8 @@ EMAIL_RAW_RE = r"""(?:[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~
 URL_RAW_RE = r"""(?:https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s"]{2,}|www\.[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s"]{2,}|https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9]+\.[^\s"]{2,}|www\.[a-zA-Z0-9]+\.[^\s"]{2,})"""
 
 MASK_RE = re.compile(f"(?:{EMAIL_RAW_RE}|{URL_RAW_RE})")
+# every match of MASK_RE contains one of these, spans without them are not searched
+MASK_TRIGGERS = ('@', 'http', 'www.')
 
 def find_spans(raw):
     """
@@ -99,6 +101,8 @@ def update_pred_regex(raw, pred):
 
     for span_begin, span_end in spans:
         text = "".join(raw[span_begin:span_end])
+        if not any(trigger in text for trigger in MASK_TRIGGERS):
+            continue
         for match in MASK_RE.finditer(text):
             match_begin, match_end = match.span()
             # first, update all characters touched by the regex to not split
@@ -114,7 +118,12 @@ def update_pred_regex(raw, pred):
 SPACE_RE = re.compile(r'\s')
 SPACE_SPLIT_RE = re.compile(r'( *[^ ]+)')
 
-def output_predictions(output_file, trainer, data_generator, vocab, mwt_dict, max_seqlen=1000, orig_text=None, no_ssplit=False, use_regex_tokens=True):
+def output_predictions(output_file, trainer, data_generator, vocab, mwt_dict, max_seqlen=1000, orig_text=None, no_ssplit=False, use_regex_tokens=True, return_paragraphs=False):
+    """
+    Tokenize all the paragraphs of the data generator and return the sentences
+
+    if return_paragraphs is set, the sentences are grouped by the paragraph they come from
+    """
     paragraphs = []
     for i, p in enumerate(data_generator.sentences):
         start = 0 if i == 0 else paragraphs[-1][2]
@@ -190,6 +199,7 @@ def output_predictions(output_file, trainer, data_generator, vocab, mwt_dict, ma
     offset = 0
     oov_count = 0
     doc = []
+    para_docs = []
 
     text = SPACE_RE.sub(' ', orig_text) if orig_text is not None else None
     char_offset = 0
@@ -202,6 +212,7 @@ def output_predictions(output_file, trainer, data_generator, vocab, mwt_dict, ma
     for j in range(len(paragraphs)):
         raw = all_raw[j]
         pred = all_preds[j]
+        para_start = len(doc)
 
         current_tok = ''
         current_sent = []
@@ -252,7 +263,10 @@ def output_predictions(output_file, trainer, data_generator, vocab, mwt_dict, ma
         assert(len(current_tok) == 0)
         if len(current_sent):
             doc.append(process_sentence(current_sent, mwt_dict))
+        para_docs.append(doc[para_start:])
 
+    if return_paragraphs:
+        return para_docs
     return doc
 #     if output_file: CoNLL.dict2conll(doc, output_file)
 #     return oov_count, offset, all_preds, doc
@@ -17,7 +17,7 @@ from pathlib import Path
 
 from dadmatools.models.common import utils
 from dadmatools.models.tokenization.trainer import Trainer
-from dadmatools.models.tokenization.data import DataLoader
+from dadmatools.models.tokenization.data import DataLoader, NEWLINE_WHITESPACE_RE
 from dadmatools.models.tokenization.utils import load_mwt_dict, eval_model, output_predictions
 # from models import _training_logging
 import dadmatools.pipeline.download as dl
@@ -103,6 +103,52 @@ def tokenize(input_sentence):
 #########################################################################################################
 
 
+class TokenizerEngine:
+    """
+    A loaded tokenizer ready for prediction: the model arguments are merged and the MWT dictionary is read only
+    once here, instead of on every call.
+    Unpacking it gives (trainer, args), as the tuple returned by load_model() used to.
+    """
+    def __init__(self, trainer, args):
+        self.trainer = trainer
+        self.vocab = trainer.vocab
+        self.args = dict(args)
+        for k in trainer.args:
+            if not k.endswith('_file') and k not in ['cuda', 'mode', 'save_dir', 'load_name', 'save_name']:
+                self.args[k] = trainer.args[k]
+        self.mwt_dict = load_mwt_dict(self.args['mwt_json_file'])
+        utils.eval_mode(trainer)
+    
+    def __iter__(self):
+        return iter((self.trainer, self.args))
+    
+    def tokenize(self, text):
+        '''tokenizes a text, a list of sentences of (token, misc) pairs is returned'''
+        batches = DataLoader(self.args, input_text=text, vocab=self.vocab, evaluation=True)
+        with utils.inference_context():
+            preds = output_predictions(self.args['conll_file'], self.trainer, batches, self.vocab, self.mwt_dict, self.args['max_seqlen'])
+        # preds = [[p['text'] for p in pred] for pred in preds]
+        return _with_mwt_misc(preds)
+    
+    def tokenize_many(self, texts):
+        '''tokenizes all the texts in a single pass of the model, a list of sentences is returned for each text'''
+        ## every text is packed as one or more paragraphs of a single input, so we keep track of how many paragraphs belong to each text
+        para_counts = [len([pt for pt in NEWLINE_WHITESPACE_RE.split(text) if len(pt.rstrip()) > 0]) for text in texts]
+        if sum(para_counts) == 0:
+            return [[] for _ in texts]
+        batches = DataLoader(self.args, input_text='\n\n'.join(texts), vocab=self.vocab, evaluation=True)
+        with utils.inference_context():
+            paragraphs = output_predictions(self.args['conll_file'], self.trainer, batches, self.vocab, self.mwt_dict, self.args['max_seqlen'], return_paragraphs=True)
+        
+        preds = []
+        index = 0
+        for count in para_counts:
+            preds.append(_with_mwt_misc([sent for para in paragraphs[index:index+count] for sent in para]))
+            index += count
+        
+        return preds
+
+
 def load_model():
     ## donwload the model (if it is not exist it'll download otherwise it dose not)
     dl.download_model('fa_tokenizer')
@@ -116,30 +162,19 @@ def load_model():
         args['cuda'] = False
     utils.set_random_seed(args['seed'], args['cuda'])
 
-    
-    mwt_dict = load_mwt_dict(args['mwt_json_file'])
     use_cuda = args['cuda'] and not args['cpu']
     trainer = Trainer(model_file=args['save_dir'], use_cuda=use_cuda)
-    loaded_args, vocab = trainer.args, trainer.vocab
-    
-    for k in loaded_args:
-        if not k.endswith('_file') and k not in ['cuda', 'mode', 'save_dir', 'load_name', 'save_name']:
-            args[k] = loaded_args[k]
     
-    return (trainer, args)
+    return TokenizerEngine(trainer, args)
 
 def tokenizer(trainer, args, input_sentence):
-    mwt_dict = load_mwt_dict(args['mwt_json_file'])
-    use_cuda = args['cuda'] and not args['cpu']
-    loaded_args, vocab = trainer.args, trainer.vocab
-    
-    for k in loaded_args:
-        if not k.endswith('_file') and k not in ['cuda', 'mode', 'save_dir', 'load_name', 'save_name']:
-            args[k] = loaded_args[k]
-    
-    batches = DataLoader(args, input_text=input_sentence, vocab=vocab, evaluation=True)
-    preds = output_predictions(args['conll_file'], trainer, batches, vocab, mwt_dict, args['max_seqlen'])
-    # preds = [[p['text'] for p in pred] for pred in preds]
+    return TokenizerEngine(trainer, args).tokenize(input_sentence)
+
+def tokenizer_batch(trainer, args, input_texts):
+    '''tokenizes all the texts in a single pass of the model, a list of sentences is returned for each text'''
+    return TokenizerEngine(trainer, args).tokenize_many(input_texts)
+
+def _with_mwt_misc(preds):
     new_preds = []
     for pred in preds:
         ps = []
@@ -149,7 +184,5 @@ def tokenizer(trainer, args, input_sentence):
             except:
                 ps.append((p['text'], 'MWT=No'))
         new_preds.append(ps)
-    preds = new_preds
-    
-    return preds
+    return new_preds
 
@@ -0,0 +1,125 @@
+"""
+Columnar output of the pipeline: the annotations of a batch of texts are kept in a few flat arrays instead of
+spaCy Doc/Span/Token objects, so a batch of a million tokens is a handful of arrays and not millions of objects.
+"""
+import numpy as np
+
+
+UPOS_TAGS = [
+    'ADJ', 'ADP', 'ADV', 'AUX', 'CCONJ', 'DET', 'INTJ', 'NOUN', 'NUM', 'PART', 'PRON', 'PROPN', 'PUNCT', 'SCONJ',
+    'SYM', 'VERB', 'X',
+]
+UD_RELATIONS = [
+    'acl', 'advcl', 'advmod', 'amod', 'appos', 'aux', 'case', 'cc', 'ccomp', 'clf', 'compound', 'conj', 'cop',
+    'csubj', 'dep', 'det', 'discourse', 'dislocated', 'expl', 'fixed', 'flat', 'goeswith', 'iobj', 'list', 'mark',
+    'nmod', 'nsubj', 'nummod', 'obj', 'obl', 'orphan', 'parataxis', 'punct', 'reparandum', 'root', 'vocative', 'xcomp',
+]
+
+
+class LabelEncoder():
+    """
+    Maps the labels to int codes. The codes of the given labels are fixed, the labels which are not known yet get
+    the next codes when they are first seen, so the codes stay the same for all the batches of a run.
+    """
+    def __init__(self, labels=()):
+        self.labels = []
+        self.index = {}
+        for label in labels:
+            self.encode(label)
+
+    def encode(self, label):
+        code = self.index.get(label)
+        if code is None:
+            code = self.index[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def encode_all(self, labels):
+        return np.fromiter((self.encode(label) for label in labels), dtype=np.int16, count=len(labels))
+
+
+class StringColumn():
+    """
+    A column of strings stored as in Arrow: the strings are concatenated in a single buffer,
+    the i-th string is data[offsets[i]:offsets[i+1]].
+    """
+    def __init__(self, strings):
+        self.data = ''.join(strings)
+        self.offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, strings), dtype=np.int64, count=len(strings)), out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i+1]]
+
+    def to_list(self):
+        return [self.data[start:end] for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())]
+
+    def to_numpy(self):
+        return np.array(self.to_list(), dtype=str)
+
+
+class ColumnarBatch():
+    """
+    The annotations of a batch of texts. The tokens of all the texts are in flat arrays:
+        doc_offsets: the sentences of the i-th text are sent_offsets[doc_offsets[i]:doc_offsets[i+1]]
+        sent_offsets: the tokens of the j-th sentence are the rows sent_offsets[j]:sent_offsets[j+1]
+        tokens, lemmas: the token and lemma strings (StringColumn)
+        pos, rels: the int codes of the UPOS tags and the dependency relations, decoded by pos_labels and rel_labels
+        heads: the heads of the tokens in their sentence (1-based, 0 is the root), as in to_json
+    the columns of the components which are not in the pipeline are None.
+    """
+    def __init__(self, doc_offsets, sent_offsets, tokens, lemmas=None, pos=None, pos_labels=None,
+                 heads=None, rels=None, rel_labels=None):
+        self.doc_offsets = doc_offsets
+        self.sent_offsets = sent_offsets
+        self.tokens = tokens
+        self.lemmas = lemmas
+        self.pos = pos
+        self.pos_labels = pos_labels
+        self.heads = heads
+        self.rels = rels
+        self.rel_labels = rel_labels
+
+    def __len__(self):
+        return len(self.doc_offsets) - 1
+
+    @property
+    def num_tokens(self):
+        return len(self.tokens)
+
+    def token_doc_ids(self):
+        """the index of the text of every token"""
+        sent_doc_ids = np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.doc_offsets))
+        return np.repeat(sent_doc_ids, np.diff(self.sent_offsets))
+
+    def token_sent_ids(self):
+        """the index (in the batch) of the sentence of every token"""
+        return np.repeat(np.arange(len(self.sent_offsets) - 1, dtype=np.int32), np.diff(self.sent_offsets))
+
+    def to_numpy(self):
+        """returns the token level columns as a dict of numpy arrays"""
+        columns = {'doc_id': self.token_doc_ids(), 'sent_id': self.token_sent_ids(), 'token': self.tokens.to_numpy()}
+        if self.lemmas is not None: columns['lemma'] = self.lemmas.to_numpy()
+        if self.pos is not None: columns['pos'] = self.pos
+        if self.heads is not None: columns['head'] = self.heads
+        if self.rels is not None: columns['rel'] = self.rels
+        return columns
+
+    def to_arrow(self):
+        """returns the token level columns as a pyarrow Table, the tags and the relations are dictionary encoded"""
+        import pyarrow as pa
+
+        columns = {'doc_id': pa.array(self.token_doc_ids()), 'sent_id': pa.array(self.token_sent_ids()),
+                   'token': pa.array(self.tokens.to_list(), pa.string())}
+        if self.lemmas is not None:
+            columns['lemma'] = pa.array(self.lemmas.to_list(), pa.string())
+        if self.pos is not None:
+            columns['pos'] = pa.DictionaryArray.from_arrays(pa.array(self.pos), pa.array(self.pos_labels, pa.string()))
+        if self.heads is not None:
+            columns['head'] = pa.array(self.heads)
+        if self.rels is not None:
+            columns['rel'] = pa.DictionaryArray.from_arrays(pa.array(self.rels), pa.array(self.rel_labels, pa.string()))
+        return pa.table(columns)
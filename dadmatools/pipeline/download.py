@@ -4,6 +4,7 @@ from pathlib import Path
 from tqdm import tqdm
 from typing import Callable
 import shutil
+import threading
 
 # DEFAULT_DESTINATION = os.path.join(str(os.getcwd()), 'saved_models')
 DEFAULT_DESTINATION = os.path.join(str(Path(__file__).parent.absolute()).replace('/pipeline', ''), 'saved_models')
@@ -57,11 +58,23 @@ class TqdmUpTo(tqdm):
         self.update(b * bsize - self.n)  # will also set self.n = b * bsize
         
         
+## models can be loaded concurrently (e.g. parsbert by both the postagger and the parser), so each model is
+## downloaded and extracted by one thread at a time
+_download_locks = {}
+_download_locks_guard = threading.Lock()
+
 def download_model(model_name: str, cache_dir: str = DEFAULT_CACHE_DIR, process_func: Callable = None,
                    clean_up_raw_data=True, force_download: bool = False, file_extension=None):
     
     if model_name not in MODELS:
         raise ValueError("The model {} do not exist".format(model_name))
+    
+    with _download_locks_guard:
+        lock = _download_locks.setdefault(model_name, threading.Lock())
+    with lock:
+        return _download_model(model_name, cache_dir, process_func, force_download, file_extension)
+
+def _download_model(model_name, cache_dir, process_func, force_download, file_extension):
 
     model_info = MODELS[model_name]
     model_info['name'] = model_name
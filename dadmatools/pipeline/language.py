@@ -1,109 +1,140 @@
 import spacy
+import srsly
 from spacy import displacy
 from spacy import pipeline
 from spacy.language import Language
 from spacy.tokens import Doc, Token, Span
 from spacy.pipeline import Sentencizer
+from spacy.util import minibatch, raise_error, SimpleFrozenList
+from spacy.errors import Errors
+from spacy.lang.fa import Persian
 
-import dadmatools.models.normalizer as normalizer
-import dadmatools.models.tokenizer as tokenizer
-import dadmatools.models.mw_tokenizer as mwt
-import dadmatools.models.lemmatizer as lemmatizer
-import dadmatools.models.postagger as tagger
-import dadmatools.models.dependancy_parser as dp
-import dadmatools.models.constituency_parser as conspars
-import dadmatools.models.ner as ner
+import weakref
+import importlib
+from abc import ABC, abstractmethod
+import numpy as np
+from concurrent.futures import Future
 
+from dadmatools.pipeline.registry import model_registry, model_key
+from dadmatools.pipeline.columnar import ColumnarBatch, StringColumn, LabelEncoder, UPOS_TAGS, UD_RELATIONS
 
-class NLP():
+
+class LazyModule():
     """
-    In this class a blank pipeline in created and it is initialized based on our trained models
-    possible pipelines: [tokenizer, lemmatize, postagger, dependancyparser]
+    A model module which is imported on first use, so loading a pipeline only imports the models it needs
+    (e.g. a tokenizer-only pipeline does not pay for flair, transformers or supar).
     """
-    tokenizer_model = None
-    mwt_model = None
-    lemma_model = None
-    postagger_model = None
-    depparser_model = None
-    normalizer_model = None
-    ner_model = None
+    def __init__(self, name):
+        self._name = name
+        self._module = None
     
-    Token.set_extension("dep_arc", default=None)
-    Doc.set_extension("sentences", default=None)
-    Doc.set_extension("chunks", default=None)
-    Doc.set_extension("constituency", default=None)
-    Doc.set_extension("ners", default=None)
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+normalizer = LazyModule('dadmatools.models.normalizer')
+tokenizer = LazyModule('dadmatools.models.tokenizer')
+mwt = LazyModule('dadmatools.models.mw_tokenizer')
+lemmatizer = LazyModule('dadmatools.models.lemmatizer')
+tagger = LazyModule('dadmatools.models.postagger')
+dp = LazyModule('dadmatools.models.dependancy_parser')
+conspars = LazyModule('dadmatools.models.constituency_parser')
+ner = LazyModule('dadmatools.models.ner')
+
+
+def get_model(model):
+    """the models are loaded in background threads, so a component waits for its model the first time it is used"""
+    if isinstance(model, Future):
+        return model.result()
+    return model
+
+
+def sentences_tokens(docs):
+    """returns the tokens of all the sentences of the docs as a flat list"""
+    return [[d.text for d in sent] for doc in docs for sent in doc._.sentences]
+
+
+class BatchComponent(ABC):
+    """
+    Base class of the components which run a model on the sentences of the docs.
+    In nlp.pipe() the sentences of all the docs in a batch are gathered and the model is called once on them,
+    the results are scattered back to the docs afterwards. A component only implements process(), the batching of
+    __call__ and pipe is done here. As in the spaCy components, a batch which fails is given to the error handler
+    of the component (nlp.set_error_handler), by default the error is raised.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.model = None
+        self.error_handler = raise_error
     
-    global nlp
-    nlp = None
+    def __call__(self, doc):
+        return self.process([doc])[0]
     
-    def __init__(self, lang, pipelines):
-        
-        global nlp
-        nlp = spacy.blank(lang)
-        self.nlp = nlp
-        
-        self.dict = {'tok':'tokenizer', 'lem':'lemmatize', 'pos':'postagger', 'dep':'dependancyparser', 'cons':'constituencyparser'}
-        self.pipelines = pipelines.split(',')
-        
-        if 'def-norm' in pipelines:
-            global normalizer_model
-            normalizer_model = normalizer.load_model()
-            self.nlp.add_pipe('normalizer', first=True)
-
-        global tokenizer_model
-        tokenizer_model = tokenizer.load_model()
-        self.nlp.add_pipe('tokenizer')
-        
-        global mwt_model
-        mwt_model = mwt.load_model()
+    def pipe(self, docs, batch_size=128):
+        for batch in minibatch(docs, size=batch_size):
+            batch = list(batch)
+            try:
+                batch = self.process(batch)
+            except Exception as e:
+                self.error_handler(self.name, self, batch, e)
+                continue
+            yield from batch
+    
+    @abstractmethod
+    def process(self, docs):
+        """runs the model once on the sentences of all the docs and returns the annotated docs"""
+    
+    def get_error_handler(self):
+        return self.error_handler
+    
+    def set_error_handler(self, error_handler):
+        self.error_handler = error_handler
 
-        if 'lem' in pipelines:
-            global lemma_model
-            lemma_model = lemmatizer.load_model()
-            self.nlp.add_pipe('lemmatize')
-        
-        if 'dep' in pipelines:
-            global depparser_model
-            depparser_model = dp.load_model()
-            self.nlp.add_pipe('dependancyparser')
-        
-        if 'pos' in pipelines:
-            global postagger_model
-            postagger_model = tagger.load_model()
-            self.nlp.add_pipe('postagger')
-        
-        if 'cons' in pipelines:
-            global consparser_model
-            consparser_model = conspars.load_model()
-            self.nlp.add_pipe('constituencyparser')
-        
-        if 'ner' in pipelines:
-            global ner_model
-            ner_model = ner.load_model()
-            self.nlp.add_pipe('ners')
-    
-    @Language.component('normalizer')
-    def tokenizer(doc):
-        model = normalizer_model
-        with doc.retokenize() as retokenizer:
-            retokenizer.merge(doc[0:len(doc)])
-        norm_text = model.normalize(doc.text)
-        words = norm_text.split(' ')
-        spaces = [True for t in words]
-        doc = Doc(nlp.vocab, words=words, spaces=spaces)
-        return doc
 
-    @Language.component('tokenizer', retokenizes=True)
-    def tokenizer(doc):
-        model, args = tokenizer_model
-        model_mwt, args_mwt = mwt_model
+class DadmaTokenizer():
+    """
+    The neural tokenizer and the MWT expander of DadmaTools as the tokenizer of the spaCy pipeline (nlp.tokenizer),
+    the docs are built directly from their tokens. If the pipeline has the normalizer, the texts are normalized first.
+    """
+    def __init__(self, vocab):
+        self.vocab = vocab
+        self.normalizer_model = None
+        self.tokenizer_model = None
+        self.mwt_model = None
+    
+    def __call__(self, text):
+        return self.tokenize([text])[0]
+    
+    def pipe(self, texts, batch_size=128):
+        for batch in minibatch(texts, size=batch_size):
+            yield from self.tokenize(list(batch))
+    
+    def tokenize(self, texts):
+        docs = []
+        for sents in self.split(texts):
+            docs.append(self.make_doc(sents))
+        return docs
+    
+    def split(self, texts):
+        """returns the sentences (lists of token strings) of each text"""
+        if self.normalizer_model is not None:
+            normalizer_model = get_model(self.normalizer_model)
+            texts = [normalizer_model.normalize(text) for text in texts]
+        tokens_lists = get_model(self.tokenizer_model).tokenize_many(texts)
+        ## all the sentences of the batch are expanded together and then split per doc again
+        sents = get_model(self.mwt_model).expand_many([l for tokens_list in tokens_lists for l in tokens_list])
         
-        with doc.retokenize() as retokenizer:
-            retokenizer.merge(doc[0:len(doc)])
+        texts_sents = []
+        index = 0
+        for tokens_list in tokens_lists:
+            texts_sents.append(sents[index:index+len(tokens_list)])
+            index += len(tokens_list)
+        return texts_sents
+    
+    def make_doc(self, tokens_list):
         starts = []
-        tokens_list = tokenizer.tokenizer(model, args, doc.text)
-        tokens_list = mwt.mwt(model_mwt, args_mwt, tokens_list)
         tokens = []
         index = 0
         for l in tokens_list:
@@ -111,7 +142,7 @@ class NLP():
             for t in l: 
                 tokens.append(t)
                 index += 1
-        doc = Doc(nlp.vocab, words=tokens)
+        doc = Doc(self.vocab, words=tokens)
         spans = []
         for idx, i in enumerate(starts):
             if idx+1 == len(starts):
@@ -121,89 +152,256 @@ class NLP():
         doc._.sentences = spans
         
         return doc
+    
+    ## the tokenizer has no data of its own, its models come from the model registry and are not serialized
+    def to_bytes(self, exclude=tuple()):
+        return srsly.msgpack_dumps({})
+    
+    def from_bytes(self, bytes_data, exclude=tuple()):
+        return self
+    
+    def to_disk(self, path, exclude=tuple()):
+        srsly.write_msgpack(path, {})
+    
+    def from_disk(self, path, exclude=tuple()):
+        return self
+
 
-    @Language.component('lemmatize', assigns=["token.lemma"])
-    def lemmatizer(doc):
+class LemmatizerComponent(BatchComponent):
+    def process(self, docs):
+        model, args = get_model(self.model)
+        tokens = sentences_tokens(docs)
+        if not any(tokens): return docs
         
-        model, args = lemma_model
-        for sent in doc._.sentences:
-            tokens = [d.text for d in sent]
-            lemmas = lemmatizer.lemma(model, args, [tokens])
-            for idx, d in enumerate(sent): d.lemma_ = lemmas[idx]
+        lemmas = lemmatizer.lemma(model, args, tokens)
+        index = 0
+        for doc in docs:
+            for d in doc:
+                d.lemma_ = lemmas[index]
+                index += 1
         
-        return doc
-    
-    @Language.component('postagger', assigns=["token.pos"])
-    def postagger(doc):
-        model = postagger_model
+        return docs
+
+
+class POSTaggerComponent(BatchComponent):
+    def process(self, docs):
+        model = get_model(self.model)
         
-        for sent in doc._.sentences:
-            tokens = [d.text for d in sent]
-            tags = tagger.postagger(model, tokens)
-            
-            for idx, d in enumerate(sent): d.pos_ = tags[idx]
+        tags = iter(tagger.postagger_batch(model, sentences_tokens(docs)))
+        for doc in docs:
+            for sent in doc._.sentences:
+                sent_tags = next(tags)
+                for idx, d in enumerate(sent): d.pos_ = sent_tags[idx]
         
-        return doc
-    
-    @Language.component('dependancyparser', assigns=["token.dep"])
-    def depparser(doc):
-        model = depparser_model
+        return docs
+
+
+class DependancyParserComponent(BatchComponent):
+    def process(self, docs):
+        model = get_model(self.model)
+        
+        preds_arcs, preds_rels = dp.depparser_batch(model, sentences_tokens(docs))
+        preds = iter(zip(preds_arcs, preds_rels))
+        for doc in docs:
+            for sent in doc._.sentences:
+                sent_arcs, sent_rels = next(preds)
+                for idx, d in enumerate(sent):
+                    arc = sent_arcs[idx]
+                    rel = sent_rels[idx]
+                    d.dep_ = rel
+                    d._.dep_arc = arc
+                    d.head = sent[arc-1]
         
-        for sent in doc._.sentences:
-            tokens = [d.text for d in sent]
-            preds_arcs, preds_rels = dp.depparser(model, tokens)
+        return docs
 
-            for idx, d in enumerate(sent):
-                arc = preds_arcs[idx]
-                rel = preds_rels[idx]
-                d.dep_ = rel
-                d._.dep_arc = arc
-                d.head = sent[arc-1]
+
+class ConstituencyParserComponent(BatchComponent):
+    def process(self, docs):
+        model = get_model(self.model)
         
-        return doc
-    
-    @Language.component('constituencyparser')
-    def constituencyparser(doc):
-        model = consparser_model
+        ## all the sentences of the batch are parsed in one call
+        parses = iter(conspars.cons_parser_batch(model, sentences_tokens(docs)))
+        for doc in docs:
+            constitu_parses = []
+            chunks = []
+            for sent in doc._.sentences:
+                cons_res = next(parses)
+                constitu_parses.append(cons_res)
+                ## the chunks of the sentence are spans of the doc labeled by their constituent
+                chunks.append([Span(doc, sent.start+start, sent.start+end, label=label) for start, end, label in conspars.chunk_spans(cons_res)])
+            doc._.constituency = constitu_parses
+            doc._.chunks = chunks
         
-        constitu_parses = []
-        chunks = []
-        for sent in doc._.sentences:
-            ## getting the constituency of the sentence
-            cons_res = conspars.cons_parser(model, sent.text)
-            constitu_parses.append(cons_res)
-            ## getting the chunks of the sentence
-            chunker_res = conspars.chunker(cons_res)
-            chunks.append(chunker_res)
+        return docs
+
+
+class NERComponent(BatchComponent):
+    def process(self, docs):
+        model = get_model(self.model)
         
-        doc._.constituency = constitu_parses
-        doc._.chunks = chunks
+        ## the IOB tags of the tokens of all the sentences of the batch
+        ners = iter(ner.ner_batch(model, sentences_tokens(docs)))
+        for doc in docs:
+            doc._.ners = [next(ners) for _ in doc._.sentences]
         
-        return doc
+        return docs
+
+
+class DadmaPersian(Persian):
+    """
+    The Persian spaCy language whose pipe() tokenizes the texts in batches,
+    spaCy itself calls the tokenizer on the texts one by one.
+    """
+    def pipe(self, texts, *, as_tuples=False, batch_size=None, disable=SimpleFrozenList(), component_cfg=None, n_process=1):
+        if as_tuples or n_process != 1:
+            yield from super().pipe(texts, as_tuples=as_tuples, batch_size=batch_size, disable=disable,
+                                    component_cfg=component_cfg, n_process=n_process)
+            return
+        batch_size = batch_size or self.batch_size
+        ## only the tokenization is done here, spaCy runs the components on the docs
+        yield from super().pipe(self.make_docs(texts, batch_size), batch_size=batch_size, disable=disable,
+                                component_cfg=component_cfg)
+    
+    def make_docs(self, texts, batch_size):
+        for batch in minibatch(texts, size=batch_size):
+            ## the texts of the batch are tokenized together, the docs are kept as they are
+            strings = [text for text in batch if isinstance(text, str)]
+            for text in strings:
+                if len(text) > self.max_length:
+                    raise ValueError(Errors.E088.format(length=len(text), max_length=self.max_length))
+            docs = iter(self.tokenizer.pipe(strings, batch_size=len(strings)) if strings else [])
+            for text in batch:
+                yield next(docs) if isinstance(text, str) else text
+
+
+def load_shared_depparser(postagger_model):
+    ## the parser of this mode is built around the encoder of the tagger, so it is kept apart from the plain one
+    return dp.load_model(shared_embeddings=get_model(postagger_model).embeddings)
+
+
+class NLP():
+    """
+    In this class a blank pipeline in created and it is initialized based on our trained models
+    possible pipelines: [tokenizer, lemmatize, postagger, dependancyparser]
+    the models are taken from the process-wide model registry, so pipelines built in the same process share them
+    """
+    Token.set_extension("dep_arc", default=None)
+    Doc.set_extension("sentences", default=None)
+    Doc.set_extension("chunks", default=None)
+    Doc.set_extension("constituency", default=None)
+    Doc.set_extension("ners", default=None)
     
-    @Language.component('ners')
-    def namedentity(doc):
-        model = ner_model
+    def __init__(self, lang, pipelines, shared_encoder=False, background_loading=False):
         
-        ners = []
-        for sent in doc._.sentences:
-            ## getting the IOB tags of the sentence
-            ners.append(ner.ner(model, sent.text))
+        ## with shared_encoder the parser and the postagger use a single ParsBERT encoder
+        shared = shared_encoder and 'dep' in pipelines and 'pos' in pipelines
+        if shared and not dp.can_share_encoder(tagger.get_config(), dp.get_config()):
+            raise ValueError('shared_encoder needs a POS tagger and a dependency parser trained on the same frozen encoder, '
+                             'the encoders of the current models were fine-tuned with each of them')
         
-        doc._.ners = ners
+        self.nlp = DadmaPersian()
+        self.nlp.tokenizer = DadmaTokenizer(self.nlp.vocab)
         
-        return doc
+        self.dict = {'tok':'tokenizer', 'lem':'lemmatize', 'pos':'postagger', 'dep':'dependancyparser', 'cons':'constituencyparser'}
+        self.pipelines = pipelines.split(',')
+        
+        ## the models are loaded concurrently and all of them are loaded before returning, with background_loading
+        ## they are futures until they are first used by the components (and the loading errors are raised there)
+        self.model_keys = []
+        self.models = []
+        
+        ## the normalizer, the tokenizer and the MWT expander are run by nlp.tokenizer
+        if 'def-norm' in pipelines:
+            self.nlp.tokenizer.normalizer_model = self.acquire(model_key('normalizer', {}), normalizer.load_model)
+        self.nlp.tokenizer.tokenizer_model = self.acquire(model_key('tokenizer', tokenizer.parse_args()), tokenizer.load_model)
+        self.nlp.tokenizer.mwt_model = self.acquire(model_key('mwt', mwt.parse_args()), mwt.load_model)
+
+        if 'lem' in pipelines:
+            component = self.nlp.add_pipe('lemmatize')
+            component.model = self.acquire(model_key('lemmatizer', lemmatizer.parse_args()), lemmatizer.load_model)
+        
+        if 'pos' in pipelines:
+            postagger_key = model_key('postagger', tagger.get_config())
+            postagger_model = self.acquire(postagger_key, tagger.load_model)
+        
+        if 'dep' in pipelines:
+            component = self.nlp.add_pipe('dependancyparser')
+            if shared:
+                ## the shared parser holds the tagger it is built around, so its encoder is not loaded twice
+                component.model = self.acquire(model_key('dependancyparser:shared_encoder', dp.get_config()), load_shared_depparser,
+                                               dependencies=[(postagger_key, tagger.load_model)])
+            else:
+                component.model = self.acquire(model_key('dependancyparser', dp.get_config()), dp.load_model)
+        
+        if 'pos' in pipelines:
+            component = self.nlp.add_pipe('postagger')
+            component.model = postagger_model
+        
+        if 'cons' in pipelines:
+            component = self.nlp.add_pipe('constituencyparser')
+            component.model = self.acquire(model_key('constituencyparser', conspars.parse_args()), conspars.load_model)
+        
+        if 'ner' in pipelines:
+            component = self.nlp.add_pipe('ners')
+            component.model = self.acquire(model_key('ner', ner.get_config()), ner.load_model)
+        
+        ## the models are released when the spaCy pipeline is garbage collected or closed
+        _finalizers[self.nlp] = weakref.finalize(self.nlp, model_registry.release_all, list(self.model_keys))
+        if not background_loading:
+            self.wait()
+    
+    def acquire(self, key, loader, dependencies=()):
+        model = model_registry.acquire(key, loader, dependencies)
+        self.model_keys.append(key)
+        self.models.append(model)
+        return model
+    
+    def wait(self):
+        """blocks until all the models of the pipeline are loaded, errors of the loading are raised here"""
+        for model in self.models:
+            get_model(model)
+    
+    @Language.factory('lemmatize', assigns=["token.lemma"])
+    def lemmatizer(nlp, name):
+        return LemmatizerComponent(name)
+    
+    @Language.factory('postagger', assigns=["token.pos"])
+    def postagger(nlp, name):
+        return POSTaggerComponent(name)
+    
+    @Language.factory('dependancyparser', assigns=["token.dep"])
+    def depparser(nlp, name):
+        return DependancyParserComponent(name)
+    
+    @Language.factory('constituencyparser')
+    def constituencyparser(nlp, name):
+        return ConstituencyParserComponent(name)
+    
+    @Language.factory('ners')
+    def namedentity(nlp, name):
+        return NERComponent(name)
+
+
+## the release callbacks of the pipelines which are alive
+_finalizers = weakref.WeakKeyDictionary()
+
+
+def close(nlp):
+    """releases the models of the pipeline, the models which no other pipeline uses are dropped from the registry"""
+    finalizer = _finalizers.pop(nlp, None)
+    if finalizer is not None:
+        finalizer()
 
    
 class Pipeline():
-    def __new__(cls, pipeline):
-        language = NLP('fa', pipeline)
+    def __new__(cls, pipeline, shared_encoder=False, background_loading=False):
+        language = NLP('fa', pipeline, shared_encoder=shared_encoder, background_loading=background_loading)
         nlp = language.nlp
         return nlp 
 
         
-def load_pipline(pipelines):
-    language = NLP('fa', pipelines)
+def load_pipline(pipelines, shared_encoder=False, background_loading=False):
+    language = NLP('fa', pipelines, shared_encoder=shared_encoder, background_loading=background_loading)
     nlp = language.nlp
     return nlp
 
@@ -223,4 +421,68 @@ def to_json(pipelines, doc):
             sentence.append(dictionary)
         dict_list.append(sentence)
     return dict_list
- 
\ No newline at end of file
+ 
+
+
+## the tags flair adds to the tag dictionaries of its taggers, they are not labels of the tokens
+SPECIAL_TAGS = {'O', '<unk>', '<START>', '<STOP>'}
+
+
+def model_label_encoder(component, labels):
+    """the standard labels get the first codes, the other labels of the model follow in the order of its tag dictionary"""
+    items = get_model(component.model).tag_dictionary.get_items()
+    return LabelEncoder(labels + [item for item in items if item not in SPECIAL_TAGS])
+
+
+## the components whose annotations have a column
+COLUMNAR_COMPONENTS = ('lemmatize', 'postagger', 'dependancyparser')
+
+
+def pipe_columns(nlp, texts, batch_size=1024):
+    """
+    Runs the models of the pipeline on the texts without building spaCy docs,
+    a ColumnarBatch with the tokens, lemmas, POS tags, heads and relations is yielded for every batch of texts.
+    """
+    unsupported = [name for name in nlp.pipe_names if name not in COLUMNAR_COMPONENTS]
+    if unsupported:
+        raise ValueError('pipe_columns does not support the components {}, use nlp.pipe for them'.format(', '.join(unsupported)))
+    ## the codes are fixed by the tag dictionaries of the models, so they are the same in every call and process
+    ## and the batches of different runs can be concatenated
+    if 'postagger' in nlp.pipe_names:
+        pos_encoder = model_label_encoder(nlp.get_pipe('postagger'), UPOS_TAGS)
+    if 'dependancyparser' in nlp.pipe_names:
+        rel_encoder = model_label_encoder(nlp.get_pipe('dependancyparser'), UD_RELATIONS)
+    for batch in minibatch(texts, size=batch_size):
+        texts_sents = nlp.tokenizer.split(list(batch))
+        sentences = [sent for sents in texts_sents for sent in sents]
+        
+        doc_offsets = np.cumsum([0] + [len(sents) for sents in texts_sents], dtype=np.int64)
+        sent_offsets = np.cumsum([0] + [len(sent) for sent in sentences], dtype=np.int64)
+        tokens = [token for sent in sentences for token in sent]
+        columns = {'tokens': StringColumn(tokens)}
+        
+        if 'lemmatize' in nlp.pipe_names:
+            lemmas = []
+            if tokens:
+                model, args = get_model(nlp.get_pipe('lemmatize').model)
+                lemmas = lemmatizer.lemma(model, args, sentences)
+            columns['lemmas'] = StringColumn(lemmas)
+        
+        if 'dependancyparser' in nlp.pipe_names:
+            preds_arcs, preds_rels = [], []
+            if tokens:
+                model = get_model(nlp.get_pipe('dependancyparser').model)
+                preds_arcs, preds_rels = dp.depparser_batch(model, sentences)
+            columns['heads'] = np.fromiter((arc for arcs in preds_arcs for arc in arcs), dtype=np.int32, count=len(tokens))
+            columns['rels'] = rel_encoder.encode_all([rel for rels in preds_rels for rel in rels])
+            columns['rel_labels'] = rel_encoder.labels
+        
+        if 'postagger' in nlp.pipe_names:
+            tags = []
+            if tokens:
+                model = get_model(nlp.get_pipe('postagger').model)
+                tags = tagger.postagger_batch(model, sentences)
+            columns['pos'] = pos_encoder.encode_all([tag for sent_tags in tags for tag in sent_tags])
+            columns['pos_labels'] = pos_encoder.labels
+        
+        yield ColumnarBatch(doc_offsets, sent_offsets, **columns)
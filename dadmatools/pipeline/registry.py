@@ -0,0 +1,92 @@
+"""
+Process-wide registry of the loaded models, so the pipelines of one process share the weights of their models.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def model_key(name, config):
+    """the registry key of a model, its config holds the paths of its files so models loaded from elsewhere are kept apart"""
+    return name + ':' + json.dumps(config, sort_keys=True, default=str)
+
+
+def model_name(key):
+    return key.split(':', 1)[0]
+
+
+class ModelRegistry():
+    """
+    The models are keyed by their name and config (see model_key). A pipeline acquires the models it uses and releases
+    them when it is closed (or garbage collected), a model is loaded in the background the first time it is acquired
+    and is dropped from the registry when no pipeline uses it anymore.
+    A model built from other models of the registry holds them as dependencies, they are kept as long as it is.
+    The models are shared between the pipelines, so they must only be used read-only.
+    """
+    def __init__(self, max_workers=9):
+        ## key -> [future, refcount, keys of the dependencies]
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dadmatools-loader')
+
+    def acquire(self, key, loader, dependencies=()):
+        """
+        returns the future of the model, the loader is only called if the model is not in the registry.
+        dependencies are the (key, loader) pairs of the models it is built from: they are acquired with the model,
+        released when it is dropped and their futures are passed to its loader.
+        """
+        with self.lock:
+            return self._acquire(key, loader, dependencies)
+
+    def _acquire(self, key, loader, dependencies):
+        entry = self.entries.get(key)
+        ## a model which failed to load is loaded again, with its dependencies
+        if entry is None or (entry[0].done() and entry[0].exception() is not None):
+            refcount = 0
+            if entry is not None:
+                refcount = entry[1]
+                for dependency in entry[2]:
+                    self._release(dependency)
+            futures = [self._acquire(dependency, dependency_loader, ()) for dependency, dependency_loader in dependencies]
+            entry = self.entries[key] = [self.executor.submit(self._load, key, loader, *futures), refcount,
+                                         [dependency for dependency, _ in dependencies]]
+        entry[1] += 1
+        return entry[0]
+
+    @staticmethod
+    def _load(key, loader, *futures):
+        ## the errors are raised where the future is waited on, far from the pipeline which acquired the model
+        try:
+            return loader(*futures)
+        except Exception as error:
+            raise RuntimeError('loading the {} model failed: {}'.format(model_name(key), error)) from error
+
+    def release(self, key):
+        with self.lock:
+            self._release(key)
+
+    def _release(self, key):
+        entry = self.entries.get(key)
+        if entry is None: return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self.entries[key]
+            for dependency in entry[2]:
+                self._release(dependency)
+
+    def release_all(self, keys):
+        for key in keys:
+            self.release(key)
+
+    def refcount(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return 0 if entry is None else entry[1]
+
+    def keys(self):
+        with self.lock:
+            return list(self.entries)
+
+
+## the registry of all the pipelines of the process
+model_registry = ModelRegistry()
@@ -0,0 +1,125 @@
+import random
+
+import pytest
+import torch
+
+embeddings_module = pytest.importorskip('dadmatools.models.flair.embeddings')
+from dadmatools.models.flair.data import Sentence, Token
+
+BertEmbeddings = embeddings_module.BertEmbeddings
+HIDDEN = 6
+
+
+class FakeTokenizer():
+    """splits the tokens into pieces of two characters, every distinct piece gets its own id"""
+    unk_token = '[UNK]'
+
+    def __init__(self):
+        self.vocab = {'[PAD]': 0, '[CLS]': 1, '[SEP]': 2, '[UNK]': 3}
+
+    def tokenize(self, text):
+        return [text[i:i+2] for i in range(0, len(text), 2)]
+
+    def convert_tokens_to_ids(self, tokens):
+        return [self.vocab.setdefault(token, len(self.vocab)) for token in tokens]
+
+
+class ContextFreeBert(torch.nn.Module):
+    """the state of a piece only depends on its id, so a sentence gives the same states whatever windows it is split in"""
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.table = torch.nn.Embedding(1000, HIDDEN)
+
+    def forward(self, input_ids, token_type_ids=None, attention_mask=None, return_dict=False, output_hidden_states=True):
+        states = self.table(input_ids)
+        return states, states[:, 0], [states]
+
+
+def make_embeddings(pooling_operation, max_sequence_length, window_stride=None):
+    embeddings = BertEmbeddings.__new__(BertEmbeddings)
+    torch.nn.Module.__init__(embeddings)
+    embeddings.tokenizer = FakeTokenizer()
+    embeddings.model = ContextFreeBert()
+    embeddings.layer_indexes = [-1]
+    embeddings.pooling_operation = pooling_operation
+    embeddings.use_scalar_mix = False
+    embeddings.name = 'bert'
+    embeddings.fine_tune = False
+    embeddings.static_embeddings = True
+    embeddings.sentence_feat = False
+    embeddings.max_sequence_length = max_sequence_length
+    embeddings.window_stride = window_stride
+    return embeddings
+
+
+def random_sentences(rng, count, max_tokens):
+    sentences = []
+    for _ in range(count):
+        sentence = Sentence()
+        for _ in range(rng.randint(1, max_tokens)):
+            sentence.add_token(Token(''.join(rng.choice('abcdefgh') for _ in range(rng.randint(1, 7)))))
+        sentences.append(sentence)
+    return sentences
+
+
+def loop_pooling(hidden_states, features, pooling_operation):
+    """the per-token loop BertEmbeddings used before the pooling was vectorized"""
+    pooled = []
+    for row, feature in enumerate(features):
+        token_idx = 1
+        for count in feature.token_subtoken_count:
+            if pooling_operation == 'first':
+                pooled.append(hidden_states[row, token_idx])
+            else:
+                pooled.append(hidden_states[row, token_idx:token_idx + count].mean(0))
+            token_idx += count
+    return torch.stack(pooled)
+
+
+## any other pooling operation than 'first' is a mean, as in the old loop
+@pytest.mark.parametrize('pooling_operation', ['first', 'last', 'mean'])
+def test_pooling_matches_the_loop(pooling_operation):
+    rng = random.Random(pooling_operation)
+    embeddings = make_embeddings(pooling_operation, 510)
+    for _ in range(5):
+        sentences = random_sentences(rng, rng.randint(1, 6), 12)
+        tokenized = embeddings._tokenize_sentences(sentences)
+        longest = max(sum(map(len, subtokens)) for subtokens in tokenized)
+        features = embeddings._convert_sentences_to_features(sentences, longest, tokenized=tokenized)
+        hidden_states = torch.randn(len(features), longest + 2, HIDDEN)
+        assert torch.allclose(embeddings._pool_subtokens(hidden_states, features), loop_pooling(hidden_states, features, pooling_operation), atol=1e-6)
+
+
+@pytest.mark.parametrize('num_subtokens, window_size, stride', [(5, 8, None), (9, 8, None), (40, 8, None), (41, 8, 3), (100, 16, 15)])
+def test_windows_own_every_subtoken_once(num_subtokens, window_size, stride):
+    windows = make_embeddings('mean', window_size, stride)._sliding_windows(num_subtokens, window_size)
+    owned = []
+    for start, end, owned_start, owned_end in windows:
+        assert 0 <= start <= owned_start < owned_end <= end <= num_subtokens and end - start <= window_size
+        owned.extend(range(owned_start, owned_end))
+    assert owned == list(range(num_subtokens))
+    ## the overlap of two windows is split in the middle, so no subtoken is read at the edge of its window
+    for (_, end, _, boundary), (next_start, _, _, _) in zip(windows, windows[1:]):
+        assert next_start <= boundary < end and abs((boundary - next_start) - (end - boundary)) <= 1
+
+
+@pytest.mark.parametrize('pooling_operation', ['first', 'mean'])
+def test_long_sentences_are_stitched_from_their_windows(pooling_operation):
+    rng = random.Random(1)
+    sentences = random_sentences(rng, 6, 30)
+    windowed = make_embeddings(pooling_operation, 9)
+    windowed._add_embeddings_internal(sentences)
+    assert any(sum(map(len, subtokens)) > 9 for subtokens in windowed._tokenize_sentences(sentences))
+
+    ## the same sentences in a single window each, pooled by the old loop
+    whole = make_embeddings(pooling_operation, 10000)
+    whole.tokenizer = windowed.tokenizer
+    tokenized = whole._tokenize_sentences(sentences)
+    longest = max(sum(map(len, subtokens)) for subtokens in tokenized)
+    features = whole._convert_sentences_to_features(sentences, longest, tokenized=tokenized)
+    hidden_states = whole.model(torch.LongTensor([f.input_ids for f in features]))[0]
+    expected = loop_pooling(hidden_states, features, pooling_operation)
+
+    stitched = torch.stack([token.get_embedding() for sentence in sentences for token in sentence])
+    assert torch.allclose(stitched, expected, atol=1e-6)
@@ -0,0 +1,63 @@
+import pytest
+
+constituency_parser = pytest.importorskip('dadmatools.models.constituency_parser')
+chunk_spans = constituency_parser.chunk_spans
+chunker = constituency_parser.chunker
+
+
+class Tree(list):
+    """the part of nltk.Tree the chunker uses"""
+    def __init__(self, node, children):
+        super().__init__(children)
+        self.node = node
+
+    def label(self):
+        return self.node
+
+    def leaves(self):
+        return [leaf for child in self for leaf in (child.leaves() if isinstance(child, Tree) else [child])]
+
+    @classmethod
+    def fromstring(cls, text):
+        tokens = text.replace('(', ' ( ').replace(')', ' ) ').split()
+        stack = [cls(None, [])]
+        for i, token in enumerate(tokens):
+            if token == '(':
+                continue
+            if token == ')':
+                node = stack.pop()
+                stack[-1].append(node)
+            elif tokens[i-1] == '(':
+                stack.append(cls(token, []))
+            else:
+                stack[-1].append(token)
+        return stack[0][0]
+
+
+def spans(text):
+    tree = Tree.fromstring(text)
+    words = tree.leaves()
+    return [(' '.join(words[start:end]), label) for start, end, label in chunk_spans(tree)]
+
+
+def test_chunks_are_runs_of_words_under_one_constituent():
+    tree = '(TOP (S (NP (_ من) (_ و) (_ او)) (NP (_ کتاب) (_ را)) (VP (_ خواندیم)) (_ .)))'
+    assert spans(tree) == [('من و او', 'NP'), ('کتاب را', 'NP'), ('خواندیم', 'VP')]
+    assert chunker(Tree.fromstring(tree)) == '[من و او NP] [کتاب را NP] [خواندیم VP] . '
+
+
+def test_inner_punctuations_do_not_split_a_constituent():
+    assert spans('(TOP (S (NP (_ او) (_ «) (_ خوب) (_ »)) (VP (_ رفت) (_ ،) (_ آمد)) (_ .)))') == \
+        [('او « خوب »', 'NP'), ('رفت ، آمد', 'VP')]
+
+
+def test_edge_punctuations_are_left_out():
+    assert spans('(TOP (S (NP (_ ،) (_ کتاب) (_ !)) (NP (_ «) (_ خوب)) (NP (_ -LRB-) (_ دو) (_ -RRB-)) (NP (_ ؟) (_ ،))))') == \
+        [('کتاب', 'NP'), ('خوب', 'NP'), ('-LRB- دو -RRB-', 'NP')]
+
+
+def test_nested_constituents_split_the_words_around_them():
+    tree = '(TOP (S (NP (_ کتاب) (PP (_ از) (NP (_ او))) (_ را)) (VP (_ دید))))'
+    assert spans(tree) == [('کتاب', 'NP'), ('از', 'PP'), ('او', 'NP'), ('را', 'NP'), ('دید', 'VP')]
+    assert chunker(Tree.fromstring(tree)) == '[کتاب NP] [از PP] [او NP] [را NP] [دید VP] '
+    assert chunk_spans(None) == []
@@ -0,0 +1,28 @@
+import numpy as np
+
+from dadmatools.pipeline.columnar import ColumnarBatch, StringColumn, LabelEncoder, UPOS_TAGS
+
+
+def test_string_column():
+    column = StringColumn(['از', '', 'کتاب'])
+    assert len(column) == 3
+    assert column[2] == 'کتاب' and column[1] == ''
+    assert column.to_list() == ['از', '', 'کتاب']
+    assert len(StringColumn([])) == 0
+
+
+def test_label_codes_are_stable():
+    encoder = LabelEncoder(UPOS_TAGS)
+    assert encoder.encode_all(['NOUN', 'VERB']).tolist() == [UPOS_TAGS.index('NOUN'), UPOS_TAGS.index('VERB')]
+    assert encoder.encode('NEW') == len(UPOS_TAGS)
+    assert encoder.encode('NEW') == len(UPOS_TAGS)
+
+
+def test_batch_ids():
+    ## three texts, the second one is empty, the first one has two sentences
+    batch = ColumnarBatch(np.array([0, 2, 2, 3]), np.array([0, 2, 3, 5]), StringColumn(list('abcde')))
+    assert len(batch) == 3 and batch.num_tokens == 5
+    columns = batch.to_numpy()
+    assert columns['doc_id'].tolist() == [0, 0, 0, 2, 2]
+    assert columns['sent_id'].tolist() == [0, 0, 1, 2, 2]
+    assert columns['token'].tolist() == list('abcde')
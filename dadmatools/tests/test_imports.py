@@ -0,0 +1,35 @@
+import sys
+import subprocess
+import pytest
+
+pytest.importorskip('spacy')
+
+HEAVY_MODULES = ['dadmatools.models.flair', 'transformers', 'pytorch_transformers', 'supar', 'gensim', 'bpemb']
+## import time (in seconds) of the dadmatools modules themselves, the dependencies are not counted
+IMPORT_TIME_BUDGET = 1.0
+
+
+def import_report(code):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    self_time = 0
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        us, _, name = line[len('import time:'):].split('|')
+        if name.strip().startswith('dadmatools'):
+            self_time += int(us) / 1e6
+    return out.stdout.split(), self_time
+
+
+def test_language_import_is_lazy():
+    code = 'import sys, dadmatools.pipeline.language; print(*[m for m in %r if m in sys.modules])' % HEAVY_MODULES
+    loaded, self_time = import_report(code)
+    assert loaded == []
+    assert self_time < IMPORT_TIME_BUDGET
+
+
+def test_flair_does_not_configure_root_logger():
+    pytest.importorskip('segtok')
+    code = 'import logging; import dadmatools.models.flair; print(len(logging.getLogger().handlers))'
+    handlers, _ = import_report(code)
+    assert handlers == ['0']
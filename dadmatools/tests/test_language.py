@@ -0,0 +1,139 @@
+import pytest
+
+pytest.importorskip('spacy')
+
+from spacy.language import Language
+from dadmatools.pipeline import language
+from dadmatools.pipeline.language import DadmaPersian, DadmaTokenizer, BatchComponent
+from dadmatools.pipeline.columnar import UPOS_TAGS
+
+
+class WhitespaceTokenizer(DadmaTokenizer):
+    """the sentences are the lines of the text, the tokens are split on whitespace"""
+    def split(self, texts):
+        return [[line.split() for line in text.split('\n')] for text in texts]
+
+
+class UpperLemmas(BatchComponent):
+    """the batches it is given are recorded, a doc with the token 'boom' fails its batch"""
+    def __init__(self, name):
+        super().__init__(name)
+        self.batch_sizes = []
+
+    def process(self, docs):
+        self.batch_sizes.append(len(docs))
+        for doc in docs:
+            for token in doc:
+                if token.text == 'boom': raise ValueError('boom')
+                token.lemma_ = token.text.upper()
+        return docs
+
+
+@Language.factory('test_upper_lemmas')
+def upper_lemmas(nlp, name):
+    return UpperLemmas(name)
+
+
+def make_nlp():
+    nlp = DadmaPersian()
+    nlp.tokenizer = WhitespaceTokenizer(nlp.vocab)
+    nlp.add_pipe('test_upper_lemmas')
+    return nlp
+
+
+def test_pipe_tokenizes_and_runs_the_components():
+    nlp = make_nlp()
+    docs = list(nlp.pipe(['a b\nc', 'd', nlp('e f')], batch_size=2))
+    assert [[t.lemma_ for t in doc] for doc in docs] == [['A', 'B', 'C'], ['D'], ['E', 'F']]
+    assert [len(sent) for sent in docs[0]._.sentences] == [2, 1]
+    assert [[t.lemma_ for t in doc] for doc in nlp.pipe(['x y'], disable=['test_upper_lemmas'])] == [['', '']]
+
+
+def test_components_implement_process():
+    with pytest.raises(TypeError):
+        BatchComponent('base')
+    assert UpperLemmas('lemmas')(make_nlp().make_doc('a b'))[1].lemma_ == 'B'
+
+
+def test_pipe_keeps_the_component_cfg_and_the_error_handler():
+    nlp = make_nlp()
+    component = nlp.get_pipe('test_upper_lemmas')
+    list(nlp.pipe(['a', 'b', 'c'], batch_size=3, component_cfg={'test_upper_lemmas': {'batch_size': 1}}))
+    assert component.batch_sizes == [1, 1, 1]
+
+    with pytest.raises(ValueError):
+        list(nlp.pipe(['a', 'boom']))
+    failed = []
+    nlp.set_error_handler(lambda name, proc, docs, e: failed.append((name, [doc[0].text for doc in docs])))
+    docs = list(nlp.pipe(['a', 'boom', 'c'], batch_size=2))
+    assert [doc[0].text for doc in docs] == ['c'] and failed == [('test_upper_lemmas', ['a', 'boom'])]
+
+
+def test_pipeline_is_serializable(tmp_path):
+    nlp = make_nlp()
+    assert nlp.to_bytes()
+    nlp.to_disk(tmp_path)
+    nlp.from_disk(tmp_path)
+    assert nlp.tokenizer.from_bytes(nlp.tokenizer.to_bytes()) is nlp.tokenizer
+
+
+class TagDictionary():
+    def __init__(self, items):
+        self.items = items
+
+    def get_items(self):
+        return list(self.items)
+
+
+class FakeModel():
+    def __init__(self, labels):
+        self.tag_dictionary = TagDictionary(['O', '<unk>'] + labels + ['<START>', '<STOP>'])
+
+
+class FakeParser():
+    """every token is attached to the previous one, the relation is read from the token text (e.g. 'a/obl:arg')"""
+    @staticmethod
+    def depparser_batch(model, sentences):
+        arcs = [list(range(len(sent))) for sent in sentences]
+        rels = [[token.split('/')[1] for token in sent] for sent in sentences]
+        return arcs, rels
+
+
+class FakeTagger():
+    @staticmethod
+    def postagger_batch(model, sentences):
+        return [['NOUN' if token.startswith('n') else 'VERB' for token in sent] for sent in sentences]
+
+
+def test_pipe_columns(monkeypatch):
+    monkeypatch.setattr(language, 'dp', FakeParser)
+    monkeypatch.setattr(language, 'tagger', FakeTagger)
+    nlp = DadmaPersian()
+    nlp.tokenizer = WhitespaceTokenizer(nlp.vocab)
+    nlp.add_pipe('dependancyparser').model = FakeModel(['root', 'obl:arg', 'nsubj:pass'])
+    nlp.add_pipe('postagger').model = FakeModel(['NOUN', 'VERB'])
+
+    first, = language.pipe_columns(nlp, ['n/obl:arg v/root\nn/nsubj:pass', ''])
+    assert first.doc_offsets.tolist() == [0, 2, 3] and first.sent_offsets.tolist() == [0, 2, 3, 3]
+    assert first.tokens.to_list() == ['n/obl:arg', 'v/root', 'n/nsubj:pass']
+    assert first.heads.tolist() == [0, 1, 0]
+    assert [first.rel_labels[code] for code in first.rels] == ['obl:arg', 'root', 'nsubj:pass']
+    assert [first.pos_labels[code] for code in first.pos] == ['NOUN', 'VERB', 'NOUN']
+
+    ## the labels which are not standard UD relations get the same codes whatever order they are seen in
+    second, = language.pipe_columns(nlp, ['n/nsubj:pass'])
+    assert second.rels.tolist() == first.rels[2:].tolist()
+    assert second.rel_labels == first.rel_labels
+    ## the tags flair adds to the tag dictionaries get no code
+    assert not set(first.rel_labels + first.pos_labels) & language.SPECIAL_TAGS
+    assert first.pos_labels[:len(UPOS_TAGS)] == UPOS_TAGS
+
+
+def test_pipe_columns_rejects_the_components_without_columns():
+    nlp = DadmaPersian()
+    nlp.tokenizer = WhitespaceTokenizer(nlp.vocab)
+    nlp.add_pipe('postagger').model = FakeModel(['NOUN', 'VERB'])
+    nlp.add_pipe('ners')
+    nlp.add_pipe('constituencyparser')
+    with pytest.raises(ValueError, match='ners, constituencyparser'):
+        next(language.pipe_columns(nlp, ['n']))
@@ -0,0 +1,58 @@
+import threading
+
+from dadmatools.models.mw_tokenizer import MWTEngine
+
+
+class StubTrainer:
+    args, vocab = {}, None
+
+    def eval(self):
+        return self
+
+
+class StubEngine(MWTEngine):
+    """expands a token by splitting it at '+', the forms sent to the model are recorded"""
+    def __init__(self, max_memo_size=100):
+        super().__init__(StubTrainer(), {'batch_size': 50}, max_memo_size=max_memo_size)
+        self.expanded = []
+
+    def expand(self, candidates):
+        self.expanded.append(sorted(candidates))
+        return {text: text.replace('+', ' ') for text in candidates}
+
+
+def test_forms_are_expanded_once():
+    engine = StubEngine()
+    sents = [[('کتاب+ها', 'MWT=Yes'), ('و', 'MWT=No')], [('کتاب+ها', 'MWT=Yes'), ('خانه+ام', 'MWT=Yes')]]
+    assert engine.expand_many(sents) == [['کتاب', 'ها', 'و'], ['کتاب', 'ها', 'خانه', 'ام']]
+    assert engine.expand_many([[('خانه+ام', 'MWT=Yes'), ('دل+ش', 'MWT=Yes')]]) == [['خانه', 'ام', 'دل', 'ش']]
+    assert engine.expanded == [['خانه+ام', 'کتاب+ها'], ['دل+ش']]
+    ## unpacking gives the loaded model and its arguments
+    trainer, args = engine
+    assert args['batch_size'] == 50
+
+
+def test_memo_evicts_the_least_recently_used_forms():
+    engine = StubEngine(max_memo_size=2)
+    engine.expand_many([[('a+1', 'MWT=Yes'), ('b+2', 'MWT=Yes')]])
+    engine.expand_many([[('a+1', 'MWT=Yes')]])
+    engine.expand_many([[('c+3', 'MWT=Yes')]])
+    assert list(engine.memo) == ['a+1', 'c+3']
+    engine.expand_many([[('a+1', 'MWT=Yes'), ('b+2', 'MWT=Yes')]])
+    assert engine.expanded[-1] == ['b+2'] and len(engine.memo) == 2
+
+
+def test_engine_is_shared_by_threads():
+    engine = StubEngine(max_memo_size=50)
+    errors = []
+    def run(seed):
+        try:
+            for i in range(200):
+                text = '{}+{}'.format(seed, i % 80)
+                assert engine.expand_many([[(text, 'MWT=Yes')]]) == [[str(seed), str(i % 80)]]
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(seed,)) for seed in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert errors == [] and len(engine.memo) <= 50
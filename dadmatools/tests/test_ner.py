@@ -0,0 +1,93 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+pytest.importorskip('transformers')
+from dadmatools.models.ner import NEREngine
+
+LABELS = ['O', 'B-PER', 'I-PER', 'B-LOC', 'I-LOC']
+MAX_LENGTH = 12
+
+
+class StubTokenizer:
+    """splits a token into pieces of two characters, a piece id is the code of its first character"""
+    cls_token_id, sep_token_id, pad_token_id = 1, 2, 0
+
+    def __init__(self, model_max_length):
+        self.model_max_length = model_max_length
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def tokenize(self, token):
+        return [token[i:i+2] for i in range(0, len(token), 2)]
+
+    def convert_tokens_to_ids(self, pieces):
+        return [ord(piece[0]) for piece in pieces]
+
+
+class StubModel(torch.nn.Module):
+    """the label of a piece only depends on its id, so the windows must give the labels of the whole sentence"""
+    def __init__(self, max_position_embeddings=512, model_type='bert'):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1))
+        self.config = SimpleNamespace(max_position_embeddings=max_position_embeddings, model_type=model_type, pad_token_id=1)
+
+    def forward(self, input_ids, attention_mask):
+        assert input_ids.size(1) <= MAX_LENGTH
+        logits = torch.nn.functional.one_hot(input_ids % len(LABELS), len(LABELS)).float()
+        return (logits.masked_fill(attention_mask.unsqueeze(-1).eq(0), 0),)
+
+
+def make_engine(batch_size=3, stride=4):
+    return NEREngine(StubModel(), StubTokenizer(MAX_LENGTH), LABELS, batch_size=batch_size, stride=stride)
+
+
+@pytest.mark.parametrize('stride', [0, 1, 4, 10])
+def test_windows_cover_the_pieces(stride):
+    engine = make_engine(stride=stride)
+    assert engine.max_pieces == MAX_LENGTH - 2
+    for num_pieces in range(0, 60):
+        windows = engine.windows(num_pieces)
+        assert windows[0][0] == 0 and windows[-1][1] == num_pieces
+        ## every piece is owned by exactly one window, which sees it
+        owned = []
+        for start, end, own_start, own_end in windows:
+            assert end - start <= engine.max_pieces
+            assert start <= own_start <= own_end <= end
+            owned.extend(range(own_start, own_end))
+        assert owned == list(range(num_pieces))
+
+
+def test_tag_many_labels_the_first_piece_of_every_token():
+    rng = random.Random(0)
+    engine = make_engine()
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    sentences = [[''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 7))) for _ in range(rng.randint(0, 15))]
+                 for _ in range(20)]
+    ## a token without any piece
+    sentences[0] = ['ab', '', 'cd']
+
+    results = engine.tag_many(sentences)
+    assert len(results) == len(sentences)
+    for tokens, result in zip(sentences, results):
+        assert [token for token, _ in result] == tokens
+        assert [label for _, label in result] == [LABELS[ord(token[0]) % len(LABELS)] if token else 'O' for token in tokens]
+
+    model, tokenizer, labels = engine
+    assert labels == LABELS
+
+
+def test_max_pieces_are_bounded_by_the_positions_of_the_model():
+    ## the max length of a tokenizer saved without one
+    sentinel = int(1e30)
+    assert NEREngine(StubModel(MAX_LENGTH), StubTokenizer(sentinel), LABELS).max_pieces == MAX_LENGTH - 2
+    ## the positions of RoBERTa start after its padding index
+    assert NEREngine(StubModel(MAX_LENGTH + 2, 'roberta'), StubTokenizer(sentinel), LABELS).max_pieces == MAX_LENGTH - 2
+    assert NEREngine(StubModel(MAX_LENGTH + 2, 'roberta'), StubTokenizer(MAX_LENGTH - 4), LABELS).max_pieces == MAX_LENGTH - 6
+
+    engine = NEREngine(StubModel(MAX_LENGTH), StubTokenizer(sentinel), LABELS, batch_size=3, stride=4)
+    sentences = [['abcdefgh'] * 20]
+    assert engine.tag_many(sentences) == [[('abcdefgh', LABELS[ord('a') % len(LABELS)])] * 20]
@@ -0,0 +1,69 @@
+import os
+
+from dadmatools.models.normalizer import Normalizer, compile_replace_plan
+from dadmatools.models.normalize.html_stripper import strip_html, iter_strip_html
+from dadmatools.models.tokenization.utils import MASK_RE, MASK_TRIGGERS
+
+## news and tweet lines with emails, urls, phone numbers and numbers in Persian and Latin digits
+with open(os.path.join(os.path.dirname(__file__), 'data', 'normalizer_sample.txt'), encoding='utf-8') as f:
+    SAMPLE = f.read().splitlines()
+
+
+def test_unify_chars():
+    normalizer = Normalizer()
+    assert normalizer.normalize('ﻛﺘﺍﺏ ۱۲٣ ك ي') == 'کتاب 123 ک ی'
+
+
+def test_char_rules_are_chained():
+    plan = compile_replace_plan([('a|b', 'c'), ('c', 'dd'), ('x+', 'y')])
+    assert len(plan) == 2
+    assert plan[1][2] is None
+    table = plan[0][1]
+    assert 'abc'.translate(table) == 'dddddd'
+
+
+def test_extra_space():
+    normalizer = Normalizer()
+    assert normalizer.normalize('سلام    دنیا\n\n\nخوبی') == 'سلام دنیا خوبی'
+
+
+def test_normalize_many():
+    normalizer = Normalizer()
+    texts = ['ﻛﺘﺍﺏ  %d' % i for i in range(50)]
+    expected = [normalizer.normalize(text) for text in texts]
+    assert list(normalizer.normalize_many(texts)) == expected
+    assert list(normalizer.normalize_many(iter(texts), n_jobs=2, chunksize=3)) == expected
+
+
+def test_stopwords_are_shared():
+    assert Normalizer().STOPWORDS is Normalizer(full_cleaning=True).STOPWORDS
+    normalizer = Normalizer(remove_stop_word=True)
+    assert normalizer.normalize('این کتاب را از او گرفتم') == 'کتاب'
+
+
+def test_strip_html():
+    html = '<p>سلام&nbsp;دنیا &amp; <b>ما</b></p><script>var x = "<p>";</script><style>p {}</style>'
+    assert strip_html(html) == '\nسلام\xa0دنیا & ما\n'
+    assert ''.join(iter_strip_html([html[i:i+5] for i in range(0, len(html), 5)])) == strip_html(html)
+    assert Normalizer(remove_html=True).normalize(html) == 'سلام دنیا & ما'
+
+def test_strip_html_unclosed_head():
+    html = '<html><head><title>T</title><meta charset=utf-8><body><p>سلام دنیا</p></body></html>'
+    assert strip_html(html) == '\nسلام دنیا\n'
+    assert strip_html(html.replace('<body>', '</head><body>')) == '\nسلام دنیا\n'
+
+
+def test_triggers_do_not_change_the_output():
+    masks = dict(replace_email_with='<EMAIL>', replace_url_with='<URL>', replace_number_with='<NUM>',
+                 replace_mobile_number_with='<MOBILE>', replace_home_number_with='<PHONE>')
+    normalizer = Normalizer(**masks)
+    unscreened = Normalizer(**masks)
+    unscreened.replace_plan = [(pattern, repl, None) for pattern, repl, _ in unscreened.replace_plan]
+    outputs = [normalizer.normalize(text) for text in SAMPLE]
+    assert outputs == [unscreened.normalize(text) for text in SAMPLE]
+    for mask in masks.values():
+        assert any(mask in output for output in outputs)
+    ## the tokenizer only searches the spans with one of the triggers
+    for text in SAMPLE:
+        for match in MASK_RE.finditer(text):
+            assert any(trigger in match.group() for trigger in MASK_TRIGGERS)
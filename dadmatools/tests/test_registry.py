@@ -0,0 +1,66 @@
+from dadmatools.pipeline.registry import ModelRegistry, model_key
+
+
+def test_models_are_shared_and_released():
+    registry = ModelRegistry()
+    loads = []
+    def loader():
+        loads.append(1)
+        return object()
+    first = registry.acquire('tokenizer', loader)
+    second = registry.acquire('tokenizer', loader)
+    assert first.result() is second.result()
+    assert len(loads) == 1 and registry.refcount('tokenizer') == 2
+    registry.release('tokenizer')
+    assert registry.keys() == ['tokenizer']
+    registry.release('tokenizer')
+    assert registry.keys() == []
+    registry.acquire('tokenizer', loader).result()
+    assert len(loads) == 2
+
+
+def test_failed_loads_are_retried():
+    registry = ModelRegistry()
+    def failing():
+        raise IOError('no model file')
+    error = registry.acquire(model_key('ner', {}), failing).exception(timeout=5)
+    assert isinstance(error, RuntimeError) and 'ner model' in str(error) and isinstance(error.__cause__, IOError)
+    assert registry.acquire('ner', failing).exception(timeout=5) is not None
+    assert registry.acquire('ner', lambda: 'model').result() == 'model'
+    assert registry.refcount('ner') == 2
+
+
+def test_keys_hold_the_config():
+    assert model_key('ner', {'save_dir': 'a'}) == model_key('ner', {'save_dir': 'a'})
+    assert model_key('ner', {'save_dir': 'a'}) != model_key('ner', {'save_dir': 'b'})
+    assert model_key('ner', {'save_dir': 'a'}) != model_key('tokenizer', {'save_dir': 'a'})
+
+
+def test_dependencies_are_held_by_the_model():
+    registry = ModelRegistry()
+    loads = []
+    def load_tagger():
+        loads.append('tagger')
+        return 'tagger'
+    tagger = registry.acquire('tagger', load_tagger)
+    parser = registry.acquire('parser', lambda tagger: ('parser', tagger.result()), dependencies=[('tagger', load_tagger)])
+    assert parser.result() == ('parser', 'tagger')
+    assert registry.refcount('tagger') == 2
+
+    ## the tagger of the pipeline is released and acquired again while the parser holds it, it is not loaded twice
+    registry.release('tagger')
+    assert registry.acquire('tagger', load_tagger) is tagger and loads == ['tagger']
+    registry.release('tagger')
+    registry.release('parser')
+    assert registry.keys() == []
+
+
+def test_failed_dependencies_are_retried():
+    registry = ModelRegistry()
+    def failing():
+        raise IOError('no model file')
+    parser = registry.acquire('parser', lambda tagger: tagger.result(), dependencies=[('tagger', failing)])
+    assert parser.exception(timeout=5) is not None
+    parser = registry.acquire('parser', lambda tagger: tagger.result(), dependencies=[('tagger', lambda: 'tagger')])
+    assert parser.result() == 'tagger'
+    assert registry.refcount('parser') == 2 and registry.refcount('tagger') == 1
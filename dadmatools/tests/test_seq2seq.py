@@ -0,0 +1,146 @@
+import pytest
+import torch
+
+import dadmatools.models.common.seq2seq_constant as constant
+from dadmatools.models.common.beam import Beam
+from dadmatools.models.common.seq2seq_model import Seq2SeqModel
+from dadmatools.models.common import utils
+
+
+def make_model(copy=False, pos=False, max_dec_len=12):
+    """a small randomly initialized model, EOS is made likely enough for the sequences to end at different steps"""
+    args = {'vocab_size': 12, 'emb_dim': 8, 'hidden_dim': 10, 'num_layers': 1, 'dropout': 0.0,
+            'max_dec_len': max_dec_len, 'attn_type': 'soft', 'copy': copy,
+            'pos': pos, 'pos_dim': 8, 'pos_vocab_size': 5}
+    model = Seq2SeqModel(args)
+    ## with the default initialization the outputs hardly depend on the inputs
+    with torch.no_grad():
+        for param in model.parameters():
+            param.normal_()
+        model.dec2vocab.bias[constant.EOS_ID] = 2.0
+    return model.eval()
+
+
+def make_batch(batch_size, vocab_size):
+    """random sources sorted by length (as the lemmatizer batches them), padded with PAD_ID"""
+    lens = sorted(torch.randint(1, 8, (batch_size,)).tolist(), reverse=True)
+    src = torch.full((batch_size, lens[0]), constant.PAD_ID, dtype=torch.long)
+    for i, length in enumerate(lens):
+        src[i, :length] = torch.randint(len(constant.VOCAB_PREFIX), vocab_size, (length,))
+    return src, src.eq(constant.PAD_ID), torch.randint(1, 5, (batch_size,))
+
+
+@torch.no_grad()
+def greedy_reference(model, src, src_mask, pos=None):
+    """the decoding loop of predict_greedy before it was tensorized, reading back every prediction"""
+    enc_inputs = model.embedding(src)
+    batch_size = enc_inputs.size(0)
+    if model.use_pos:
+        pos_inputs = model.pos_drop(model.pos_embedding(pos))
+        enc_inputs = torch.cat([pos_inputs.unsqueeze(1), enc_inputs], dim=1)
+        src_mask = torch.cat([src_mask.new_zeros([batch_size, 1]), src_mask], dim=1)
+    src_lens = list(src_mask.data.eq(constant.PAD_ID).long().sum(1))
+    h_in, (hn, cn) = model.encode(enc_inputs, src_lens)
+
+    dec_inputs = model.embedding(model.SOS_tensor)
+    dec_inputs = dec_inputs.expand(batch_size, dec_inputs.size(0), dec_inputs.size(1))
+    done = [False for _ in range(batch_size)]
+    total_done = 0
+    max_len = 0
+    output_seqs = [[] for _ in range(batch_size)]
+    while total_done < batch_size and max_len < model.max_dec_len:
+        log_probs, (hn, cn) = model.decode(dec_inputs, hn, cn, h_in, src_mask, src=src)
+        _, preds = log_probs.squeeze(1).max(1, keepdim=True)
+        dec_inputs = model.embedding(preds)
+        max_len += 1
+        for i in range(batch_size):
+            if not done[i]:
+                token = preds.data[i][0].item()
+                if token == constant.EOS_ID:
+                    done[i] = True
+                    total_done += 1
+                else:
+                    output_seqs[i].append(token)
+    return output_seqs
+
+
+@pytest.mark.parametrize('copy,pos', [(False, False), (True, False), (False, True)])
+def test_greedy_decoding_matches_the_step_by_step_loop(copy, pos):
+    torch.manual_seed(0)
+    for max_dec_len in [1, 3, 12]:
+        for batch_size in [1, 2, 5]:
+            model = make_model(copy=copy, pos=pos, max_dec_len=max_dec_len)
+            src, src_mask, pos_ids = make_batch(batch_size, model.vocab_size)
+            preds, _ = model.predict_greedy(src, src_mask, pos=pos_ids)
+            assert preds == greedy_reference(model, src, src_mask, pos=pos_ids)
+            assert model.predict(src, src_mask, pos=pos_ids, beam_size=1)[0] == preds
+
+
+@torch.no_grad()
+def beam_reference(model, src, src_mask, pos=None, beam_size=5):
+    """the beam search of predict before it was batched, with one Beam per sentence"""
+    enc_inputs = model.embedding(src)
+    batch_size = enc_inputs.size(0)
+    if model.use_pos:
+        pos_inputs = model.pos_drop(model.pos_embedding(pos))
+        enc_inputs = torch.cat([pos_inputs.unsqueeze(1), enc_inputs], dim=1)
+        src_mask = torch.cat([src_mask.new_zeros([batch_size, 1]), src_mask], dim=1)
+    src_lens = list(src_mask.data.eq(constant.PAD_ID).long().sum(1))
+    h_in, (hn, cn) = model.encode(enc_inputs, src_lens)
+
+    h_in = h_in.data.repeat(beam_size, 1, 1)
+    src_mask = src_mask.repeat(beam_size, 1)
+    hn = hn.data.repeat(beam_size, 1)
+    cn = cn.data.repeat(beam_size, 1)
+    beam = [Beam(beam_size) for _ in range(batch_size)]
+
+    def update_state(states, idx, positions, beam_size):
+        for e in states:
+            br, d = e.size()
+            s = e.contiguous().view(beam_size, br // beam_size, d)[:,idx]
+            s.data.copy_(s.data.index_select(0, positions))
+
+    for i in range(model.max_dec_len):
+        dec_inputs = torch.stack([b.get_current_state() for b in beam]).t().contiguous().view(-1, 1)
+        dec_inputs = model.embedding(dec_inputs)
+        log_probs, (hn, cn) = model.decode(dec_inputs, hn, cn, h_in, src_mask, src=src)
+        log_probs = log_probs.view(beam_size, batch_size, -1).transpose(0,1).contiguous()
+        done = []
+        for b in range(batch_size):
+            if beam[b].advance(log_probs.data[b]):
+                done += [b]
+            update_state((hn, cn), b, beam[b].get_current_origin(), beam_size)
+        if len(done) == batch_size:
+            break
+
+    all_hyp = []
+    for b in range(batch_size):
+        _, ks = beam[b].sort_best()
+        all_hyp += [utils.prune_hyp([i.item() for i in beam[b].get_hyp(ks[0])])]
+    return all_hyp
+
+
+## the per-sentence search did not repeat src for the copy attention, so only the models without copy are compared
+@pytest.mark.parametrize('pos', [False, True])
+def test_batched_beam_matches_the_sentence_beams(pos):
+    torch.manual_seed(1)
+    for max_dec_len in [1, 3, 12]:
+        for batch_size in [1, 2, 5]:
+            for beam_size in [2, 5]:
+                model = make_model(pos=pos, max_dec_len=max_dec_len)
+                src, src_mask, pos_ids = make_batch(batch_size, model.vocab_size)
+                preds, _ = model.predict(src, src_mask, pos=pos_ids, beam_size=beam_size)
+                assert preds == beam_reference(model, src, src_mask, pos=pos_ids, beam_size=beam_size)
+
+
+def test_batched_beam_with_copy_attention():
+    torch.manual_seed(2)
+    model = make_model(copy=True)
+    src, src_mask, _ = make_batch(4, model.vocab_size)
+    preds, _ = model.predict(src, src_mask, beam_size=3)
+    assert len(preds) == 4
+    assert all(constant.EOS_ID not in pred and len(pred) <= model.max_dec_len for pred in preds)
+    ## a sentence is decoded the same alone and in a batch
+    for i in range(4):
+        length = int(src_mask[i].eq(0).sum())
+        assert model.predict(src[i:i+1, :length], src_mask[i:i+1, :length], beam_size=3)[0] == [preds[i]]
@@ -0,0 +1,107 @@
+import copy
+
+import pytest
+import torch
+
+pytest.importorskip('segtok')
+
+from dadmatools.models.flair.embeddings import TokenEmbeddings, StackedEmbeddings
+from dadmatools.models.flair.models import SemanticDependencyParser, FastSequenceTagger
+from dadmatools.models import dependancy_parser, postagger
+from dadmatools.pipeline import language
+
+
+def token_id(text):
+    return sum(map(ord, text)) % 64
+
+
+class ContextualEmbeddings(TokenEmbeddings):
+    """a small stand-in for BERT: the state of a token depends on the other tokens of its sentence"""
+    def __init__(self, seed=0):
+        super().__init__()
+        self.name = 'contextual-{}'.format(seed)
+        self.static_embeddings = False
+        self.calls = 0
+        torch.manual_seed(seed)
+        self.table = torch.nn.Embedding(64, 8)
+
+    @property
+    def embedding_length(self):
+        return 8
+
+    def _add_embeddings_internal(self, sentences):
+        self.calls += 1
+        for sentence in sentences:
+            ids = torch.tensor([token_id(token.text) for token in sentence])
+            states = self.table(ids)
+            states = states + states.mean(0, keepdim=True)
+            for token, state in zip(sentence, states):
+                token.set_embedding(self.name, state)
+        if hasattr(sentences, 'features'):
+            sentences = self.assign_batch_features(sentences)
+        return sentences
+
+
+def make_parser(embeddings):
+    torch.manual_seed(1)
+    return SemanticDependencyParser(hidden_size=16, embeddings=embeddings, tag_dictionary=dependancy_parser.make_tag_dictionary(),
+                                    tag_type='dependency', binary=False, n_mlp_arc=8, n_mlp_rel=8, mlp_dropout=0.0,
+                                    word_dropout=0.0, locked_dropout=0.0, testing=True).eval()
+
+
+def make_tagger(embeddings):
+    torch.manual_seed(2)
+    return FastSequenceTagger(hidden_size=16, embeddings=embeddings, tag_dictionary=postagger.make_tag_dictionary(),
+                              tag_type='upos', use_crf=True, use_rnn=False, dropout=0.0, word_dropout=0.0,
+                              locked_dropout=0.0, testing=True).eval()
+
+
+SENTENCES = [['علی', 'به', 'مدرسه', 'رفت', '.'], ['سلام'], []]
+
+
+def test_parser_is_built_around_the_shared_embeddings():
+    saved = make_parser(StackedEmbeddings([ContextualEmbeddings(seed=3)]))
+    shared = StackedEmbeddings([ContextualEmbeddings(seed=4)])
+    weights = {key: value.clone() for key, value in shared.state_dict().items()}
+
+    parser = SemanticDependencyParser._init_model_with_state_dict(saved._get_state_dict(), testing=True, embeddings=shared)
+    assert parser.embeddings is shared
+    assert all(torch.equal(value, shared.state_dict()[key]) for key, value in weights.items())
+    assert torch.equal(parser.arc_attn.weight, saved.arc_attn.weight)
+
+
+def tag_values(preds):
+    return [[label.value for label in sent] for sent in preds]
+
+
+def frozen_config(config, **changes):
+    config = copy.deepcopy(config)
+    for embedding in config['embeddings'].values():
+        embedding['fine_tune'] = False
+        embedding.update(changes)
+    return config
+
+
+def test_encoder_is_only_shared_when_both_heads_were_trained_on_it_frozen():
+    tagger_config, parser_config = postagger.get_config(), dependancy_parser.get_config()
+    ## the released models fine-tune their own encoders
+    assert not dependancy_parser.can_share_encoder(tagger_config, parser_config)
+    assert dependancy_parser.can_share_encoder(frozen_config(tagger_config), frozen_config(parser_config))
+    assert not dependancy_parser.can_share_encoder(frozen_config(tagger_config), frozen_config(parser_config, layers='-1,-2'))
+    with pytest.raises(ValueError):
+        language.NLP('fa', 'tok,pos,dep', shared_encoder=True)
+
+
+def test_shared_encoder_keeps_the_outputs():
+    encoder = ContextualEmbeddings()
+    embeddings = StackedEmbeddings([encoder])
+    ## the parser was saved with its own copy of the frozen encoder
+    saved = make_parser(StackedEmbeddings([copy.deepcopy(encoder)]))
+    tagger = make_tagger(embeddings)
+    tags = tag_values(tagger.predict_batch(SENTENCES))
+
+    parser = SemanticDependencyParser._init_model_with_state_dict(saved._get_state_dict(), testing=True, embeddings=embeddings)
+    assert parser.predict_batch(SENTENCES, prediction_mode=True) == saved.predict_batch(SENTENCES, prediction_mode=True)
+    ## the tagger encodes the sentences itself, without the <ROOT> token of the parser
+    assert tag_values(tagger.predict_batch(SENTENCES)) == tags
+    assert [len(sent_tags) for sent_tags in tags] == [len(tokens) for tokens in SENTENCES]
@@ -0,0 +1,114 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+import torch
+
+fn = pytest.importorskip('dadmatools.models.flair.parser.utils.fn')
+from dadmatools.models.flair.parser.utils.alg import eisner, backtrack
+from dadmatools.models.flair.algorithms.maximum_spanning_tree import decode_mst
+
+
+def random_heads(rng, length, seq_len):
+    """heads of a sentence padded to seq_len, the words may be their own heads and form cycles"""
+    heads = [0] + [rng.randint(0, length) for _ in range(length)]
+    return heads + [rng.randint(-1, seq_len - 1) for _ in range(seq_len - length - 1)]
+
+
+@pytest.mark.parametrize('proj', [False, True])
+def test_istree_batch_matches_istree(proj):
+    rng = random.Random(proj)
+    for _ in range(50):
+        lens = [rng.randint(1, 8) for _ in range(rng.randint(1, 8))]
+        seq_len = max(lens) + 1
+        sequences = np.array([random_heads(rng, length, seq_len) for length in lens])
+        expected = [fn.istree(sequence[:length + 1].tolist(), proj) for sequence, length in zip(sequences, lens)]
+        assert fn.istree_batch(sequences, np.array(lens), proj).tolist() == expected
+
+
+def test_crossing_arcs_match_isprojective():
+    rng = random.Random(0)
+    for _ in range(200):
+        length = rng.randint(1, 8)
+        heads = np.array([[-1] + [rng.randint(0, length) for _ in range(length)]])
+        positions = np.arange(length + 1)[None]
+        assert (not fn.crossing_arcs(heads, positions).any()) == fn.isprojective(heads[0].tolist())
+
+
+def recursive_backtrack(p_i, p_c, heads, i, j, complete):
+    """the recursive backtracking eisner used before"""
+    if i == j:
+        return
+    if complete:
+        r = p_c[i, j]
+        recursive_backtrack(p_i, p_c, heads, i, r, False)
+        recursive_backtrack(p_i, p_c, heads, r, j, True)
+    else:
+        r, heads[j] = p_i[i, j], i
+        i, j = sorted((i, j))
+        recursive_backtrack(p_i, p_c, heads, i, r, True)
+        recursive_backtrack(p_i, p_c, heads, j, r + 1, True)
+
+
+def test_backtrack_matches_the_recursive_version():
+    rng = random.Random(0)
+    for _ in range(100):
+        length = rng.randint(1, 12)
+        p_i = np.zeros((length + 1, length + 1), dtype=np.int64)
+        p_c = np.zeros((length + 1, length + 1), dtype=np.int64)
+        ## random back-pointers in the ranges eisner gives them
+        for i, j in itertools.permutations(range(length + 1), 2):
+            low, high = min(i, j), max(i, j)
+            p_i[i, j] = rng.randint(low, high - 1)
+            p_c[i, j] = rng.randint(low + 1, high) if i < j else rng.randint(low, high - 1)
+        expected = np.zeros(length + 1, dtype=np.int64)
+        recursive_backtrack(p_i, p_c, expected, 0, length, True)
+        assert backtrack(p_i, p_c, length).tolist() == expected.tolist()
+
+
+def best_tree_score(scores, length, proj, single_root=False):
+    """the score of the best tree of a sentence, found by trying all the heads"""
+    best = float('-inf')
+    for heads in itertools.product(range(length + 1), repeat=length):
+        sequence = [0] + list(heads)
+        if any(head == dep for dep, head in enumerate(sequence[1:], 1)) or not fn.istree(list(sequence), proj):
+            continue
+        if single_root and heads.count(0) != 1:
+            continue
+        best = max(best, sum(scores(dep, head) for dep, head in enumerate(sequence[1:], 1)))
+    return best
+
+
+## eisner attaches a single word to the root
+def test_eisner_finds_the_best_projective_tree():
+    torch.manual_seed(0)
+    lens = [1, 3, 5, 4, 2, 5, 5]
+    seq_len = max(lens) + 1
+    scores = torch.randn(len(lens), seq_len, seq_len)
+    mask = torch.zeros(len(lens), seq_len, dtype=torch.bool)
+    for i, length in enumerate(lens):
+        mask[i, 1:length + 1] = True
+    preds = eisner(scores, mask)
+    for i, length in enumerate(lens):
+        heads = preds[i, :length + 1].tolist()
+        assert fn.istree(list(heads), True)
+        score = sum(scores[i, dep, heads[dep]].item() for dep in range(1, length + 1))
+        assert score == pytest.approx(best_tree_score(lambda dep, head: scores[i, dep, head].item(), length, True, single_root=True))
+        assert preds[i, length + 1:].eq(0).all()
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_decode_mst_finds_the_best_tree(ties):
+    rng = np.random.RandomState(int(ties))
+    for length in [1, 2, 3, 4, 5]:
+        for _ in range(5):
+            ## energy[head, dep], with ties the scores are small integers
+            energy = rng.randint(0, 3, (length + 1, length + 1)).astype(float) if ties else rng.randn(length + 1, length + 1)
+            ## a few arcs are not allowed, every word keeps the root as a possible head
+            energy[1:, 1:][rng.rand(length, length) < 0.2] = float('-inf')
+            heads, _ = decode_mst(energy.copy(), length + 1, has_labels=False)
+            heads = heads.tolist()
+            assert fn.istree(list(heads), False) and all(head != dep for dep, head in enumerate(heads[1:], 1))
+            score = sum(energy[heads[dep], dep] for dep in range(1, length + 1))
+            assert score == pytest.approx(best_tree_score(lambda dep, head: energy[head, dep], length, False))
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+import torch
+
+sequence_tagger_model = pytest.importorskip('dadmatools.models.flair.models.sequence_tagger_model')
+from dadmatools.models.flair.data import Dictionary
+
+SequenceTagger = sequence_tagger_model.SequenceTagger
+
+
+def make_tagger(num_tags, enhanced_batch=None):
+    """a tagger with only what the Viterbi decoders read, its transitions are random"""
+    tag_dictionary = Dictionary()
+    for tag in ['O'] + ['T{}'.format(i) for i in range(num_tags)] + ['<START>', '<STOP>']:
+        tag_dictionary.add_item(tag)
+    tagger = SequenceTagger.__new__(SequenceTagger)
+    torch.nn.Module.__init__(tagger)
+    tagger.tag_dictionary = tag_dictionary
+    tagger.tagset_size = len(tag_dictionary)
+    tagger.transitions = torch.randn(tagger.tagset_size, tagger.tagset_size)
+    tagger.enhanced_crf = enhanced_batch is not None
+    if tagger.enhanced_crf:
+        tagger.enhanced_transitions = torch.randn(enhanced_batch, tagger.tagset_size, tagger.tagset_size)
+    return tagger
+
+
+@pytest.mark.parametrize('enhanced', [False, True])
+def test_batch_decoding_matches_the_sentence_decoder(enhanced):
+    rng = random.Random(enhanced)
+    torch.manual_seed(int(enhanced))
+    for _ in range(10):
+        lengths = [rng.randint(1, 12) for _ in range(rng.randint(1, 6))]
+        tagger = make_tagger(rng.randint(1, 8), len(lengths) if enhanced else None)
+        feats = torch.randn(len(lengths), max(lengths), tagger.tagset_size)
+
+        confidences, paths, scores = tagger._viterbi_decode_batch(feats, lengths, all_scores=True)
+        for i, length in enumerate(lengths):
+            expected_confidences, expected_path, expected_scores = tagger._viterbi_decode(feats[i, :length], all_scores=True, current_idx=i)
+            assert paths[i, :length].tolist() == [int(tag) for tag in expected_path]
+            assert torch.allclose(confidences[i, :length], torch.tensor(expected_confidences))
+            assert torch.allclose(scores[i, :length], torch.tensor(expected_scores))
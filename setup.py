@@ -16,7 +16,7 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     install_requires=[
 	"bpemb>=0.3.3",
-	"spacy==3.0.0",
+	"spacy>=3.2.0",
     	"sklearn>=0.0",
 	"torch>=1.7.1",
 	"transformers==4.9.1",
@@ -28,7 +28,6 @@ setuptools.setup(
 	"segtok==1.5.7",
 	"tabulate>=0.8.6",
 	"supar>=1.1.2",
-	"html2text",
 	"gensim>=3.6.0",
 	"fasttext==0.9.2"
     ],